@@ -1,22 +1,48 @@
 # app.py - VERSION 5.2 - FIXED TRIAL EXPIRY BEHAVIOR (SYNTAX ERROR FIXED)
-from flask import Flask, render_template, request, session, jsonify, redirect, url_for, send_file
+from flask import Flask, render_template, request, session, jsonify, redirect, url_for, send_file, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from werkzeug.utils import secure_filename
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from datetime import datetime, timedelta, timezone
 import random
+import secrets
 import string
 import os
 import json
 import logging
 from logging.handlers import RotatingFileHandler
-from sqlalchemy import func, or_, and_, text, distinct  # ADDED: Import distinct
+from sqlalchemy import func, or_, and_, text, distinct, inspect, event, case, tuple_, bindparam, create_engine  # ADDED: Import distinct
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, undefer_group
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
 from functools import wraps
 import uuid
 import time
+import threading
+import hashlib
+import mmap
+import struct
+import sqlite3
+import base64
+import zlib
+import atexit
+
+import click
+import numpy as np
+from collections import Counter, deque
 
 # Optional extensions
 from flask_cors import CORS
 from flask_compress import Compress
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson  # Optional: much faster JSON encode/decode
+except ImportError:
+    orjson = None
 
 # -------------------- Flask app setup --------------------
 app = Flask(
@@ -30,6 +56,56 @@ app = Flask(
 CORS(app)
 Compress(app)
 
+# -------------------- JSON --------------------
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def json_dumps_bytes(obj):
+    """Compact UTF-8 JSON bytes - orjson when installed, stdlib otherwise"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def json_dumps(obj):
+    """Compact JSON text for DB blobs"""
+    return json_dumps_bytes(obj).decode('utf-8')
+
+def json_loads(data):
+    """Decode JSON text or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_response_with_fragments(data, **fragments):
+    """JSON response for `data` with pre-encoded JSON fragments spliced in as extra fields"""
+    parts = [b'{']
+    for name, fragment in fragments.items():
+        parts.append(json_dumps_bytes(name) + b':' + fragment + b',')
+    parts.append(json_dumps_bytes(data)[1:])
+    return app.response_class(b''.join(parts), mimetype='application/json')
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson when it is installed. Output keeps the
+    default provider's behaviour (sorted keys, Flask's handling of dates and
+    other types); indented output (debug mode) still goes through the stdlib.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.get('indent') or kwargs.get('cls'):
+            return super().dumps(obj, **kwargs)
+        option = _ORJSON_OPTIONS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+app.json = FastJSONProvider(app)
+
 # Logging setup with rotation
 handler = RotatingFileHandler('msh_cbt.log', maxBytes=1_000_000, backupCount=3)
 handler.setLevel(logging.INFO)
@@ -41,11 +117,51 @@ app.logger.handlers = logger.handlers
 # IMPORTANT: SECRET_KEY should be set in environment for production
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'a_temporary_fallback_key_for_dev_only_change_this_in_production')
 
-# Database config
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///msh_cbt_hub.db'
+# Database config - DATABASE_URL overrides the local SQLite file (e.g. PostgreSQL in production)
+def get_database_url():
+    url = os.environ.get('DATABASE_URL', 'sqlite:///msh_cbt_hub.db')
+    # Render/Heroku hand out postgres:// URLs, which SQLAlchemy no longer accepts
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def env_flag(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+app.config['SQLALCHEMY_DATABASE_URI'] = get_database_url()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Per-worker connection pool; pre-ping drops connections the server closed while idle
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_pre_ping': env_flag('DB_POOL_PRE_PING', '1')}
+if app.config['SQLALCHEMY_DATABASE_URI'] not in ('sqlite://', 'sqlite:///:memory:'):
+    # In-memory SQLite uses a single static connection, so there is no pool to size
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'].update({
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    })
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
 
+# SQLite tuning, applied to every new connection. WAL lets readers carry on while
+# a submission commits; busy_timeout makes concurrent writers wait for the lock
+# instead of failing with "database is locked".
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 20000))
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+    # Negative cache_size is in KiB rather than pages
+    cursor.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}')
+    cursor.close()
+
 # Initialize DB
 db = SQLAlchemy(app)
 
@@ -66,7 +182,8 @@ class User(db.Model):
     device_id = db.Column(db.String(100))
     last_activity = db.Column(db.DateTime, default=datetime.utcnow)
     # V5: Add fields for localStorage tracking
-    browser_data = db.Column(db.Text)  # Store localStorage data as JSON
+    browser_data = db.deferred(db.Column(db.Text))  # Legacy - now stored in Payload (kind 'browser_data')
+    sync_revision = db.Column(db.Integer, default=0)  # Bumped whenever synced browser data or results change
 
     # Relationship with exam results
     exam_results = db.relationship('ExamResult', backref='user', lazy=True)
@@ -75,11 +192,12 @@ class User(db.Model):
 class ActivationCode(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(20), unique=True, nullable=False)
-    is_used = db.Column(db.Boolean, default=False)
+    is_used = db.Column(db.Boolean, default=False, nullable=False)
     used_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     used_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime)
+    batch_label = db.Column(db.String(50))
 
     used_user = db.relationship('User', foreign_keys=[used_by], backref='used_activation_codes')
 
@@ -93,11 +211,19 @@ class ExamResult(db.Model):
     percentage = db.Column(db.Float, nullable=False)
     time_taken = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    user_answers = db.Column(db.Text)
-    questions_data = db.Column(db.Text)
+    # Heavy JSON columns load only on access, or together via undefer_group('detail').
+    # user_answers/questions_data are legacy - new results keep them in Payload.
+    user_answers = db.deferred(db.Column(db.Text), group='detail')
+    questions_data = db.deferred(db.Column(db.Text), group='detail')  # Legacy/offline results only - server results store references
+    # Server-scored results: "subject#id" question references (issued from bank_version) plus a per-subject summary
+    bank_version = db.Column(db.String(32))
+    question_refs = db.deferred(db.Column(db.Text), group='detail')
+    subject_scores = db.Column(db.Text)
     # V5: Add fields for localStorage sync
     browser_synced = db.Column(db.Boolean, default=False)
     last_sync_time = db.Column(db.DateTime)
+    # Identity of the attempt (see result_fingerprint) - unique, so re-submits and re-syncs are no-ops
+    fingerprint = db.Column(db.String(32))
     
     # Add a unique constraint to prevent duplicate entries
     __table_args__ = (
@@ -105,6 +231,26 @@ class ExamResult(db.Model):
                            name='unique_exam_result'),
     )
 
+# Columns for result listings - history views never need the per-question detail
+RESULT_SUMMARY_COLUMNS = (
+    ExamResult.id, ExamResult.exam_type, ExamResult.subjects, ExamResult.score, ExamResult.total_questions,
+    ExamResult.percentage, ExamResult.time_taken, ExamResult.created_at, ExamResult.browser_synced
+)
+
+def result_fingerprint(user_id, exam_type, subjects, score, total_questions, taken_at=None, exam_id=None):
+    """
+    Deterministic identity of one exam attempt. Server-scored attempts are identified
+    by their exam session; offline attempts by their content and the second they were taken.
+    """
+    if exam_id:
+        identity = f"session:{exam_id}"
+    else:
+        if taken_at is not None and taken_at.tzinfo is not None:
+            taken_at = taken_at.astimezone(timezone.utc).replace(tzinfo=None)
+        taken = taken_at.strftime('%Y-%m-%dT%H:%M:%S') if taken_at else ''
+        identity = f"{exam_type}|{subjects}|{score}|{total_questions}|{taken}"
+    return hashlib.sha256(f"{user_id}|{identity}".encode('utf-8')).hexdigest()[:32]
+
 class UserSession(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -129,35 +275,363 @@ class TemporaryData(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime, nullable=False)
 
-# Ensure tables exist
+class UserStats(db.Model):
+    """Running exam aggregates per user, updated in the same transaction as each result insert"""
+    __tablename__ = 'user_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_exams = db.Column(db.Integer, default=0, nullable=False)
+    percentage_sum = db.Column(db.Float, default=0, nullable=False)
+    best_percentage = db.Column(db.Float, default=0, nullable=False)
+    # JSON: {subject: {exams, correct, total}}, {exam_type: {exams, percentage_sum, best_percentage}}
+    subject_totals = db.Column(db.Text)
+    exam_type_totals = db.Column(db.Text)
+    # JSON: {"YYYY-MM-DD": exams} for the last STATS_WINDOW_DAYS days
+    daily_counts = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Payload(db.Model):
+    """Compressed JSON blobs kept out of the main tables - one row per (owner, kind)"""
+    __tablename__ = 'payload'
+    owner_type = db.Column(db.String(20), primary_key=True)  # 'exam_result' or 'user'
+    owner_id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), primary_key=True)  # 'user_answers', 'questions_data', 'browser_data'
+    codec = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.Integer)  # uncompressed bytes
+    data = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# -------------------- PAYLOAD STORE --------------------
+# Codec name -> (compress, decompress) over bytes. The codec is stored per row,
+# so switching PAYLOAD_CODEC only affects payloads written afterwards.
+PAYLOAD_CODECS = {
+    'none': (bytes, bytes),
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+}
+PAYLOAD_CODEC = os.environ.get('PAYLOAD_CODEC', 'zlib')
+# Below this many bytes compression is not worth the CPU
+PAYLOAD_MIN_COMPRESS = 256
+
+def register_payload_codec(name, compress, decompress):
+    PAYLOAD_CODECS[name] = (compress, decompress)
+
+def pack_payload(raw):
+    """(codec, data) for raw JSON bytes"""
+    codec = PAYLOAD_CODEC if len(raw) >= PAYLOAD_MIN_COMPRESS else 'none'
+    return codec, PAYLOAD_CODECS[codec][0](raw)
+
+def unpack_payload(row):
+    return json_loads(PAYLOAD_CODECS[row.codec][1](row.data))
+
+def payload_row(owner_type, owner_id, kind, raw):
+    """Column values of a new payload row from raw JSON bytes, for bulk inserts"""
+    codec, data = pack_payload(raw)
+    return {
+        'owner_type': owner_type, 'owner_id': owner_id, 'kind': kind,
+        'codec': codec, 'size': len(raw), 'data': data, 'updated_at': datetime.utcnow()
+    }
+
+def store_payload(owner_type, owner_id, kind, value):
+    """Insert or replace one payload (any JSON-serializable value) in the current transaction"""
+    raw = json_dumps_bytes(value)
+    codec, data = pack_payload(raw)
+    row = db.session.get(Payload, (owner_type, owner_id, kind))
+    if row is None:
+        row = Payload(owner_type=owner_type, owner_id=owner_id, kind=kind)
+        db.session.add(row)
+    row.codec = codec
+    row.size = len(raw)
+    row.data = data
+    row.updated_at = datetime.utcnow()
+    return row
+
+def load_payload(owner_type, owner_id, kind, default=None, inline=None):
+    """
+    Decoded payload, or `default` when there is none. `inline` is a callable returning
+    the pre-payload column value, read only for rows not moved yet.
+    """
+    row = db.session.get(Payload, (owner_type, owner_id, kind))
+    if row is not None:
+        return unpack_payload(row)
+    legacy = inline() if inline else None
+    return json_loads(legacy) if legacy else default
+
+def load_payloads(owner_type, owner_ids, kind):
+    """owner_id -> decoded payload for many owners in one query"""
+    rows = Payload.query.filter(
+        Payload.owner_type == owner_type, Payload.kind == kind, Payload.owner_id.in_(owner_ids)
+    ).all() if owner_ids else []
+    return {row.owner_id: unpack_payload(row) for row in rows}
+
+def has_payload(owner_type, owner_id_column, kind):
+    """SQL EXISTS condition for use in queries over the owner table"""
+    return db.session.query(Payload.owner_id).filter(
+        Payload.owner_type == owner_type, Payload.owner_id == owner_id_column, Payload.kind == kind
+    ).exists()
+
+# -------------------- SCHEMA MIGRATIONS --------------------
+# create_all() only creates missing tables; every later change to existing
+# tables (columns, indexes) is a numbered migration recorded in schema_version.
+# Append new migrations at the end - never edit or renumber applied ones.
+MIGRATIONS = []
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+def add_missing_columns(connection, table, columns):
+    """Add the columns a table lacks - `table` is the bare name, quoted here for reserved words like user"""
+    existing_columns = {column['name'] for column in inspect(connection).get_columns(table)}
+    quoted_table = connection.dialect.identifier_preparer.quote(table)
+    for column_name, column_type in columns:
+        if column_name not in existing_columns:
+            connection.execute(text(f'ALTER TABLE {quoted_table} ADD COLUMN {column_name} {column_type}'))
+
+@migration(1, 'Indexes for cleanup, sessions and activity queries')
+def migration_001(connection):
+    connection.execute(text('CREATE INDEX IF NOT EXISTS idx_temporary_data_expires ON temporary_data(expires_at)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS idx_temporary_data_key ON temporary_data(data_type, data_key)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS idx_user_sessions_activity ON user_session(last_activity)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS idx_exam_results_user_date ON exam_result(user_id, created_at)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS idx_users_last_activity ON "user"(last_activity)'))
+
+@migration(2, 'Server-scored exam result columns')
+def migration_002(connection):
+    add_missing_columns(connection, 'exam_result', [
+        ('bank_version', 'VARCHAR(32)'), ('question_refs', 'TEXT'), ('subject_scores', 'TEXT')
+    ])
+
+@migration(3, 'Composite indexes for device, session and result lookups')
+def migration_003(connection):
+    # Activation codes are looked up by code, which its unique index already covers
+    connection.execute(text('CREATE INDEX IF NOT EXISTS idx_users_device_id ON "user"(device_id)'))
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS idx_user_sessions_active ON user_session(user_id, is_active, login_time)'
+    ))
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS idx_exam_results_dedup '
+        'ON exam_result(user_id, exam_type, subjects, score, total_questions)'
+    ))
+
+@migration(4, 'Keyset pagination indexes for admin user and code lists')
+def migration_004(connection):
+    connection.execute(text('CREATE INDEX IF NOT EXISTS idx_users_created ON "user"(created_at, id)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS idx_activation_codes_created ON activation_code(created_at, id)'))
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS idx_activation_codes_used_created ON activation_code(is_used, created_at, id)'
+    ))
+
+@migration(5, 'Move result and browser data blobs to the compressed payload table')
+def migration_005(connection):
+    payload = Payload.__table__
+    for table, owner_type, column in (
+        ('exam_result', 'exam_result', 'user_answers'),
+        ('exam_result', 'exam_result', 'questions_data'),
+        ('"user"', 'user', 'browser_data'),
+    ):
+        while True:
+            rows = connection.execute(text(
+                f'SELECT id, {column} FROM {table} WHERE {column} IS NOT NULL LIMIT 500'
+            )).fetchall()
+            if not rows:
+                break
+            connection.execute(payload.insert(), [
+                payload_row(owner_type, owner_id, column, value.encode('utf-8')) for owner_id, value in rows
+            ])
+            connection.execute(
+                text(f'UPDATE {table} SET {column} = NULL WHERE id IN ({",".join(str(row[0]) for row in rows)})')
+            )
+
+@migration(6, 'Batch labels for bulk-minted activation codes')
+def migration_006(connection):
+    add_missing_columns(connection, 'activation_code', [('batch_label', 'VARCHAR(50)')])
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS idx_activation_codes_batch ON activation_code(batch_label, id)'
+    ))
+
+@migration(7, 'Unique exam result fingerprints')
+def migration_007(connection):
+    add_missing_columns(connection, 'exam_result', [('fingerprint', 'VARCHAR(32)')])
+
+    # Backfill in id order; an attempt already seen (old duplicates) gets a per-row fingerprint
+    seen = set()
+    last_id = 0
+    while True:
+        rows = connection.execute(text(
+            'SELECT id, user_id, exam_type, subjects, score, total_questions, created_at FROM exam_result '
+            'WHERE id > :last_id ORDER BY id LIMIT 500'
+        ), {'last_id': last_id}).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            created_at = row.created_at
+            if isinstance(created_at, str):
+                created_at = datetime.fromisoformat(created_at)
+            fingerprint = result_fingerprint(row.user_id, row.exam_type, row.subjects, row.score,
+                                             row.total_questions, taken_at=created_at)
+            if fingerprint in seen:
+                fingerprint = result_fingerprint(row.user_id, row.exam_type, row.subjects, row.score,
+                                                 row.total_questions, exam_id=f"legacy-{row.id}")
+            seen.add(fingerprint)
+            updates.append({'id': row.id, 'fingerprint': fingerprint})
+        connection.execute(text('UPDATE exam_result SET fingerprint = :fingerprint WHERE id = :id'), updates)
+        last_id = rows[-1].id
+
+    connection.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_exam_results_fingerprint ON exam_result(fingerprint)'
+    ))
+    # The five-column duplicate lookup is gone
+    connection.execute(text('DROP INDEX IF EXISTS idx_exam_results_dedup'))
+
+@migration(8, 'Per-user browser data sync revision')
+def migration_008(connection):
+    add_missing_columns(connection, 'user', [('sync_revision', 'INTEGER DEFAULT 0')])
+
+@migration(9, 'Non-null activation code flags and a batch keyset index')
+def migration_009(connection):
+    # A NULL flag forced "unused" filters into an OR that cannot walk one index in order
+    connection.execute(text('UPDATE activation_code SET is_used = :unused WHERE is_used IS NULL'), {'unused': False})
+    if connection.dialect.name == 'sqlite':
+        # SQLite cannot add NOT NULL to an existing column, so triggers enforce it
+        for name, timing in (('insert', 'INSERT'), ('update', 'UPDATE OF is_used')):
+            connection.execute(text(
+                f'CREATE TRIGGER IF NOT EXISTS trg_activation_code_is_used_{name} BEFORE {timing} ON activation_code '
+                "WHEN NEW.is_used IS NULL BEGIN SELECT RAISE(ABORT, 'activation_code.is_used may not be NULL'); END"
+            ))
+    else:
+        connection.execute(text('ALTER TABLE activation_code ALTER COLUMN is_used SET NOT NULL'))
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS idx_activation_codes_batch_created ON activation_code(batch_label, created_at, id)'
+    ))
+
+@migration(10, 'Expiry index for purging exam sessions')
+def migration_010(connection):
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS idx_temporary_data_type_expires ON temporary_data(data_type, expires_at)'
+    ))
+
+# How long a worker whose migration failed waits for another worker to record it
+MIGRATION_WAIT_SECONDS = float(os.environ.get('MIGRATION_WAIT_SECONDS', 30))
+
+def migration_recorded(engine, version):
+    with engine.connect() as connection:
+        return connection.execute(
+            text('SELECT 1 FROM schema_version WHERE version = :v'), {'v': version}
+        ).first() is not None
+
+def run_migrations(engine):
+    """
+    Apply pending migrations in order, each in its own transaction. A failed
+    migration is only tolerated when another worker records it meanwhile;
+    otherwise it raises, so a broken schema stops the deploy instead of
+    failing requests later.
+    """
+    with engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_version ('
+            'version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at TIMESTAMP)'
+        ))
+        applied = {row[0] for row in connection.execute(text('SELECT version FROM schema_version'))}
+
+    for version, description, apply in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        try:
+            with engine.begin() as connection:
+                apply(connection)
+                connection.execute(
+                    text('INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)'),
+                    {'v': version, 'd': description, 't': datetime.utcnow()}
+                )
+            logger.info(f"Applied schema migration {version}: {description}")
+        except Exception as migration_error:
+            # Another worker starting at the same time may be applying it - its record is what counts
+            deadline = time.monotonic() + MIGRATION_WAIT_SECONDS
+            while not migration_recorded(engine, version):
+                if time.monotonic() >= deadline:
+                    logger.error(f"Schema migration {version} failed: {str(migration_error)}")
+                    raise
+                time.sleep(0.5)
+            logger.info(f"Schema migration {version} was applied by another worker")
+
+# Ensure tables exist and are up to date
 with app.app_context():
     try:
         db.create_all()
         logger.info("Database tables created successfully")
-        
-        try:
-            # FIXED: Wrapped SQL strings with text() function
-            db.session.execute(text('CREATE INDEX IF NOT EXISTS idx_temporary_data_expires ON temporary_data(expires_at)'))
-            db.session.execute(text('CREATE INDEX IF NOT EXISTS idx_user_sessions_activity ON user_session(last_activity)'))
-            db.session.execute(text('CREATE INDEX IF NOT EXISTS idx_exam_results_user_date ON exam_result(user_id, created_at)'))
-            db.session.execute(text('CREATE INDEX IF NOT EXISTS idx_users_last_activity ON user(last_activity)'))
-            db.session.commit()
-            logger.info("Database indexes created successfully")
-        except Exception as index_error:
-            logger.warning(f"Index creation warning: {str(index_error)}")
-            
     except Exception as e:
         logger.error(f"Error creating database tables: {str(e)}")
+    # Not caught: the code must not serve a schema it does not match
+    run_migrations(db.engine)
 
 # -------------------- HELPERS - V5 ENHANCED --------------------
+ACTIVATION_CODE_CHARS = string.ascii_uppercase + string.digits
+
 def generate_activation_code():
-    """Generate MSH-XXXX-XXXX format codes"""
+    """Generate MSH-XXXX-XXXX format codes (CSPRNG - codes are bearer secrets)"""
     prefix = "MSH-"
-    chars = string.ascii_uppercase + string.digits
-    first_part = ''.join(random.choices(chars, k=4))
-    second_part = ''.join(random.choices(chars, k=4))
+    first_part = ''.join(secrets.choice(ACTIVATION_CODE_CHARS) for _ in range(4))
+    second_part = ''.join(secrets.choice(ACTIVATION_CODE_CHARS) for _ in range(4))
     return prefix + first_part + "-" + second_part
 
+MINT_CHUNK_SIZE = 1000
+MINT_MAX_COUNT = 100000
+# Ten years - longer would be a code that never expires, and timedelta overflows far beyond it
+MINT_MAX_EXPIRES_DAYS = 3650
+
+def insert_ignoring_duplicates(model, rows, key):
+    """
+    Insert rows in one statement, silently skipping rows that would violate a
+    unique constraint (`key` is the unique column). Returns the ids of inserted rows.
+    """
+    if not rows:
+        return []
+    table = model.__table__
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+        stmt = dialect_insert(table).on_conflict_do_nothing().returning(table.c.id)
+        return [row.id for row in db.session.execute(stmt, rows)]
+
+    # Other databases: one set-based lookup per batch instead of a SELECT per row
+    key_column = table.c[key]
+    existing = {value for (value,) in db.session.query(key_column).filter(
+        key_column.in_([row[key] for row in rows])
+    )}
+    fresh = [row for row in rows if row[key] not in existing]
+    if not fresh:
+        return []
+    db.session.execute(table.insert(), fresh)
+    return [row_id for (row_id,) in db.session.query(table.c.id).filter(
+        key_column.in_([row[key] for row in fresh])
+    )]
+
+def mint_activation_codes(count, batch_label, expires_at):
+    """
+    Create `count` new codes under `batch_label` with set-based inserts. Collisions
+    on the unique code are dropped by the database and made up in the next round,
+    so there are no per-code round-trips. Returns the number of codes created.
+    """
+    batch_count = lambda: db.session.query(func.count(ActivationCode.id)).filter(
+        ActivationCode.batch_label == batch_label
+    ).scalar()
+    target = batch_count() + count
+    created_at = datetime.utcnow()
+
+    missing = count
+    while missing > 0:
+        for start in range(0, missing, MINT_CHUNK_SIZE):
+            codes = {generate_activation_code() for _ in range(min(MINT_CHUNK_SIZE, missing - start))}
+            insert_ignoring_duplicates(ActivationCode, [
+                {'code': code, 'is_used': False, 'created_at': created_at,
+                 'expires_at': expires_at, 'batch_label': batch_label}
+                for code in codes
+            ], 'code')
+        missing = target - batch_count()
+    return count
+
 def admin_required(f):
     """Decorator to ensure user is logged in and is an admin"""
     @wraps(f)
@@ -173,91 +647,714 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+TRIAL_SECONDS = 3600  # 1 hour
+
 def check_trial_status(user):
     """Check if user's trial period is still active"""
     if user.is_activated:
         return True
     
     if user.device_id and user.trial_start:
-        trial_end = user.trial_start + timedelta(hours=1)
+        trial_end = user.trial_start + timedelta(seconds=TRIAL_SECONDS)
         return datetime.utcnow() < trial_end
     
     return False
 
 def check_access_status(user):
     """V5.2 FIX: Check user access status - returns detailed status"""
-    if user.is_activated:
+    return claim_access_status(trial_claim_for(user))
+
+# -------------------- TRIAL CLAIMS --------------------
+# Entitlement is carried in a signed claim in the session, so access checks and
+# trial status need no database reads. Claims are re-read from the user row
+# after TRIAL_CLAIM_MAX_AGE seconds and re-issued whenever the entitlement changes.
+TRIAL_CLAIM_MAX_AGE = int(os.environ.get('TRIAL_CLAIM_MAX_AGE', 600))
+trial_claim_serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='trial-claim')
+
+def trial_claim_for(user):
+    """Everything access checks need to know about a user"""
+    # Only device-bound users get a trial (see check_trial_status)
+    trial_start = user.trial_start if user.device_id and user.trial_start else None
+    return {
+        'uid': user.id,
+        'activated': bool(user.is_activated),
+        'admin': bool(user.is_admin),
+        'trial_start': trial_start.isoformat() if trial_start else None,
+        'trial_seconds': TRIAL_SECONDS
+    }
+
+def claim_trial_window(claim):
+    """(trial_start, trial_end) of a claim, or (None, None) without a trial"""
+    if not claim.get('trial_start'):
+        return None, None
+    trial_start = datetime.fromisoformat(claim['trial_start'])
+    return trial_start, trial_start + timedelta(seconds=claim['trial_seconds'])
+
+def claim_access_status(claim):
+    """Access status of a trial claim - same rules as check_access_status()"""
+    if claim['activated']:
         return {'status': 'activated', 'has_access': True}
     
-    if user.is_admin:
+    if claim['admin']:
         return {'status': 'admin', 'has_access': True}
     
     # Check trial status
-    trial_active = check_trial_status(user)
-    if trial_active:
+    trial_start, trial_end = claim_trial_window(claim)
+    if trial_end and datetime.utcnow() < trial_end:
         return {'status': 'trial', 'has_access': True}
     else:
         # V5.2 FIX: Trial expired - user can login but only access activation
         return {'status': 'expired', 'has_access': False, 'message': 'Trial expired. Please activate your account.'}
 
+def issue_trial_claim(user):
+    """Sign the user's current entitlement into the session"""
+    claim = trial_claim_for(user)
+    session['trial_claim'] = trial_claim_serializer.dumps(claim)
+    return claim
+
+def current_trial_claim():
+    """
+    The logged-in user's trial claim. A missing, tampered, expired or foreign
+    claim is replaced by a fresh one from the database; None if the user is gone.
+    """
+    if 'user_id' not in session:
+        return None
+
+    token = session.get('trial_claim')
+    if token:
+        try:
+            claim = trial_claim_serializer.loads(token, max_age=TRIAL_CLAIM_MAX_AGE)
+            if claim.get('uid') == session['user_id']:
+                return claim
+        except BadSignature:
+            pass
+
+    user = db.session.get(User, session['user_id'])
+    return issue_trial_claim(user) if user else None
+
+STATS_WINDOW_DAYS = 30
+
+def apply_result_to_stats(stats, result, subject_scores=None):
+    """Fold one exam result into a UserStats row"""
+    percentage = result.percentage or 0
+    stats.total_exams = (stats.total_exams or 0) + 1
+    stats.percentage_sum = (stats.percentage_sum or 0) + percentage
+    stats.best_percentage = max(stats.best_percentage or 0, percentage)
+
+    if subject_scores is None and result.subject_scores:
+        subject_scores = json_loads(result.subject_scores)
+    subject_totals = json_loads(stats.subject_totals) if stats.subject_totals else {}
+    for subject in (result.subjects or '').split(','):
+        if not subject:
+            continue
+        totals = subject_totals.setdefault(subject, {'exams': 0, 'correct': 0, 'total': 0})
+        totals['exams'] += 1
+        scores = (subject_scores or {}).get(subject)
+        if scores:
+            totals['correct'] += scores.get('correct', 0)
+            totals['total'] += scores.get('total', 0)
+    stats.subject_totals = json_dumps(subject_totals)
+
+    exam_type_totals = json_loads(stats.exam_type_totals) if stats.exam_type_totals else {}
+    totals = exam_type_totals.setdefault(result.exam_type, {'exams': 0, 'percentage_sum': 0, 'best_percentage': 0})
+    totals['exams'] += 1
+    totals['percentage_sum'] += percentage
+    totals['best_percentage'] = max(totals['best_percentage'], percentage)
+    stats.exam_type_totals = json_dumps(exam_type_totals)
+
+    # Daily buckets for the rolling window; older buckets are dropped as they age out
+    window_start = (datetime.utcnow() - timedelta(days=STATS_WINDOW_DAYS)).date().isoformat()
+    daily_counts = json_loads(stats.daily_counts) if stats.daily_counts else {}
+    day = (result.created_at or datetime.utcnow()).date().isoformat()
+    if day >= window_start:
+        daily_counts[day] = daily_counts.get(day, 0) + 1
+    stats.daily_counts = json_dumps({d: n for d, n in daily_counts.items() if d >= window_start})
+    stats.updated_at = datetime.utcnow()
+
+def build_user_stats(user_id):
+    """Create a user's stats row from their full result history (first use, or after a regrade)"""
+    stats = UserStats(user_id=user_id, total_exams=0, percentage_sum=0, best_percentage=0)
+    for result in ExamResult.query.filter_by(user_id=user_id).order_by(ExamResult.id):
+        apply_result_to_stats(stats, result)
+    db.session.add(stats)
+    db.session.flush()
+    return stats
+
+def record_exam_result(result, subject_scores=None):
+    """Add a new (flushed or pending) result to its user's stats - call before committing the result"""
+    stats = db.session.get(UserStats, result.user_id)
+    if stats is None:
+        # Built from history, which already includes this result once it is flushed
+        db.session.flush()
+        return build_user_stats(result.user_id)
+    apply_result_to_stats(stats, result, subject_scores)
+    return stats
+
 def get_user_stats(user_id):
     """Get user statistics for dashboard"""
     try:
-        total_exams = ExamResult.query.filter_by(user_id=user_id).count()
+        stats = db.session.get(UserStats, user_id)
+        if stats is None:
+            stats = build_user_stats(user_id)
+            db.session.commit()
 
-        if total_exams > 0:
-            avg_score = db.session.query(func.avg(ExamResult.percentage)).filter_by(user_id=user_id).scalar()
-            avg_score = round(avg_score, 1) if avg_score else 0
-            
-            thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-            recent_exams = ExamResult.query.filter(
-                ExamResult.user_id == user_id,
-                ExamResult.created_at >= thirty_days_ago
-            ).count()
-        else:
-            avg_score = 0
-            recent_exams = 0
+        window_start = (datetime.utcnow() - timedelta(days=STATS_WINDOW_DAYS)).date().isoformat()
+        daily_counts = json_loads(stats.daily_counts) if stats.daily_counts else {}
+        average_score = round(stats.percentage_sum / stats.total_exams, 1) if stats.total_exams else 0
 
         return {
-            'total_exams': total_exams,
-            'average_score': avg_score,
-            'recent_exams': recent_exams
+            'total_exams': stats.total_exams,
+            'average_score': average_score,
+            'recent_exams': sum(n for day, n in daily_counts.items() if day >= window_start),
+            'best_score': stats.best_percentage,
+            'subjects': json_loads(stats.subject_totals) if stats.subject_totals else {},
+            'exam_types': json_loads(stats.exam_type_totals) if stats.exam_type_totals else {}
         }
     except Exception as e:
         logger.error(f"Error getting user stats: {str(e)}")
+        db.session.rollback()
         return {'total_exams': 0, 'average_score': 0, 'recent_exams': 0}
 
-def load_questions_from_file(exam_type, subject):
-    """Load questions from JSON files with enhanced error handling"""
+# -------------------- QUESTION BANK REGISTRY --------------------
+QUESTIONS_DIR = os.path.join(app.root_path, 'questions')
+
+def normalize_bank_key(exam_type, subject):
+    """Normalize (exam_type, subject) the same way question file names are built"""
+    exam_part = str(exam_type).strip().lower()
+    subject_part = str(subject).strip().lower().replace(' ', '_')
+    return exam_part, subject_part
+
+QUESTION_OPTION_KEYS = ('A', 'B', 'C', 'D')
+# Field order of a normalized question; `fields=` projections keep this order
+QUESTION_FIELDS = ('id', 'question', 'passage', 'options', 'correct_answer', 'explanation', 'section', 'subject')
+# What the exam screen renders - explanations are fetched lazily after submission
+EXAM_QUESTION_FIELDS = tuple(field for field in QUESTION_FIELDS if field != 'explanation')
+# Projections the bank stores pre-encoded (shared through the compiled artifact); others are built per worker
+STORED_QUESTION_PROJECTIONS = (QUESTION_FIELDS, EXAM_QUESTION_FIELDS)
+SECTIONS_FILE = os.path.join(QUESTIONS_DIR, 'sections.json')
+QUESTION_BANK_STRICT = env_flag('QUESTION_BANK_STRICT', '0')
+
+def load_known_sections(questions_dir):
+    """Known syllabus sections per bank ("{exam}_{subject}" -> set), from questions/sections.json"""
     try:
-        exam_part = str(exam_type).strip().lower()
-        subject_part = str(subject).strip().lower().replace(' ', '_')
+        with open(os.path.join(questions_dir, 'sections.json'), 'r', encoding='utf-8') as f:
+            return {name: set(sections) for name, sections in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
 
-        file_name = f"{exam_part}_{subject_part}.json"
-        file_path = os.path.join(app.root_path, 'questions', file_name)
+def parse_question_fields(value, default=None):
+    """
+    Parse a `fields=` projection ("id,question,options" or a list) into a tuple in
+    QUESTION_FIELDS order. Returns `default` when not given; raises ValueError on unknown fields.
+    """
+    if value is None or value == '':
+        return default
+    if isinstance(value, str):
+        value = value.split(',')
+    requested = {str(field).strip() for field in value if str(field).strip()}
+    unknown = requested.difference(QUESTION_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown question fields: {', '.join(sorted(unknown))}")
+    return tuple(field for field in QUESTION_FIELDS if field in requested)
+
+def project_question(question, fields=None):
+    """Copy of a question with only the requested fields (all of them when fields is None)"""
+    if fields is None:
+        return question
+    return {field: question[field] for field in fields if field in question}
+
+def validate_question_data(data, known_sections=None):
+    """Check a parsed question file against the bank schema, returning a list of errors"""
+    if not isinstance(data, dict) or not isinstance(data.get('questions'), list):
+        return ['missing "questions" list']
+
+    errors = []
+    questions = data['questions']
+    seen_ids = {}
+
+    if 'total_questions' in data and data['total_questions'] != len(questions):
+        errors.append(f"total_questions is {data['total_questions']} but the file has {len(questions)} questions")
+
+    for position, question in enumerate(questions, start=1):
+        if not isinstance(question, dict):
+            errors.append(f"question #{position}: not an object")
+            continue
 
-        if not os.path.exists(file_path):
-            logger.warning(f"Question file not found: {file_path}")
-            return None
+        question_id = question.get('id')
+        where = f"question #{position} (id {question_id})"
 
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        if not isinstance(question_id, int) or isinstance(question_id, bool):
+            errors.append(f"{where}: id must be an integer")
+        elif question_id in seen_ids:
+            errors.append(f"{where}: duplicate id (also question #{seen_ids[question_id]})")
+        else:
+            seen_ids[question_id] = position
+
+        text = question.get('question')
+        if not isinstance(text, str) or not text.strip():
+            errors.append(f"{where}: question text is missing")
+
+        options = question.get('options')
+        if not isinstance(options, dict) or sorted(options) != list(QUESTION_OPTION_KEYS):
+            errors.append(f"{where}: options must be exactly {', '.join(QUESTION_OPTION_KEYS)}")
+            options = {}
+        elif any(not isinstance(value, str) or not value.strip() for value in options.values()):
+            errors.append(f"{where}: option text is missing")
+
+        answer = question.get('correct_answer')
+        if not isinstance(answer, str) or answer.strip().upper() not in QUESTION_OPTION_KEYS:
+            errors.append(f"{where}: correct_answer must be one of {', '.join(QUESTION_OPTION_KEYS)}")
+        elif options and answer.strip().upper() not in options:
+            errors.append(f"{where}: correct_answer {answer} is not among the options")
+
+        section = question.get('section')
+        if not isinstance(section, str) or not section:
+            errors.append(f"{where}: section is missing")
+        elif known_sections is not None and section not in known_sections:
+            errors.append(f"{where}: unknown section \"{section}\" (add it to sections.json)")
+
+    return errors
+
+def normalize_question(question, subject):
+    """Canonical form of a validated question - fixed key order, trimmed text, upper-case answer"""
+    normalized = {
+        'id': question['id'],
+        'question': question['question'].strip()
+    }
+    if question.get('passage'):
+        normalized['passage'] = question['passage']
+    normalized['options'] = {key: question['options'][key].strip() for key in QUESTION_OPTION_KEYS}
+    normalized['correct_answer'] = question['correct_answer'].strip().upper()
+    normalized['explanation'] = (question.get('explanation') or '').strip()
+    normalized['section'] = question['section']
+    normalized['subject'] = question.get('subject') or subject
+    return normalized
+
+def read_question_file(file_path, subject, known_sections=None):
+    """Parse and validate a single question file, returning (normalized questions or None, errors)"""
+    try:
+        with open(file_path, 'rb') as f:
+            data = json_loads(f.read())
+    except (OSError, ValueError) as e:
+        return None, [f"invalid JSON: {str(e)}"]
+
+    errors = validate_question_data(data, known_sections)
+    if errors:
+        return None, errors
+
+    return [normalize_question(question, subject) for question in data['questions']], []
+
+def question_sources_digest(questions_dir):
+    """Content hash of every question file - identifies a bank version"""
+    digest = hashlib.sha256()
+    for file_name in sorted(os.listdir(questions_dir)):
+        if file_name.endswith('.json'):
+            digest.update(file_name.encode('utf-8'))
+            with open(os.path.join(questions_dir, file_name), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def build_section_index(sections):
+    """Map each section to a sorted int array of the question indices in it"""
+    index = {}
+    for position, section in enumerate(sections):
+        index.setdefault(section, []).append(position)
+    return {section: np.array(positions, dtype=np.intp) for section, positions in sorted(index.items())}
+
+class QuestionBank:
+    """
+    In-memory registry of every {exam}_{subject}.json file in questions/.
+    A bank is parsed once and never mutated afterwards - callers must copy
+    questions before changing them. Reloading builds a new bank and swaps the
+    module-level reference, so requests in flight keep the bank they started with.
+    """
 
-        if 'questions' not in data:
-            logger.error(f"Invalid question file structure: {file_path}")
-            return None
+    def __init__(self, banks, version, errors=None):
+        self._banks = banks
+        # Each question encoded once per stored projection; responses are assembled from these immutable fragments
+        self._fragments = {
+            key: [json_dumps_bytes(question) for question in questions]
+            for key, questions in banks.items()
+        }
+        self._exam_fragments = {
+            key: [json_dumps_bytes(project_question(question, EXAM_QUESTION_FIELDS)) for question in questions]
+            for key, questions in banks.items()
+        }
+        self._sections = {
+            key: build_section_index(question['section'] for question in questions)
+            for key, questions in banks.items()
+        }
+        self._ids = {key: [question['id'] for question in questions] for key, questions in banks.items()}
+        self._id_index = {key: {question_id: i for i, question_id in enumerate(ids)} for key, ids in self._ids.items()}
+        self.version = version
+        self.errors = errors or {}
+        self.loaded_at = datetime.utcnow()
+
+    @classmethod
+    def load(cls, questions_dir):
+        """Validate and load every bank; invalid files are left out and reported in .errors"""
+        known_sections = load_known_sections(questions_dir)
+        banks = {}
+        errors = {}
+        for file_name in sorted(os.listdir(questions_dir)):
+            stem, ext = os.path.splitext(file_name)
+            if ext != '.json' or '_' not in stem:
+                continue
 
-        # Add subject identifier to each question
-        for question in data['questions']:
-            question.setdefault('subject', subject_part)
+            exam_part, subject_part = normalize_bank_key(*stem.split('_', 1))
+            questions, file_errors = read_question_file(
+                os.path.join(questions_dir, file_name), subject_part, known_sections.get(stem)
+            )
+            if file_errors:
+                errors[file_name] = file_errors
+                logger.error(f"Invalid question file {file_name} ({len(file_errors)} errors): "
+                             + '; '.join(file_errors[:5]))
+            elif questions:
+                banks[(exam_part, subject_part)] = questions
+
+        logger.info(f"Question bank loaded from JSON: {len(banks)} subject banks, "
+                    f"{sum(len(q) for q in banks.values())} questions, {len(errors)} invalid files")
+        return cls(banks, question_sources_digest(questions_dir), errors)
+
+    def keys(self):
+        return list(self._banks.keys())
+
+    def count(self, exam_type, subject):
+        return len(self._banks.get(normalize_bank_key(exam_type, subject), ()))
+
+    def questions_at(self, exam_type, subject, indices):
+        questions = self._banks[normalize_bank_key(exam_type, subject)]
+        return [questions[i] for i in indices]
+
+    def section_index(self, exam_type, subject):
+        """Section -> question indices for one subject bank (read-only)"""
+        return self._sections.get(normalize_bank_key(exam_type, subject), {})
+
+    def question_ids(self, exam_type, subject):
+        """Question ids of a subject bank in index order (read-only)"""
+        return self._ids.get(normalize_bank_key(exam_type, subject), [])
+
+    def index_of(self, exam_type, subject, question_id):
+        """Index of a question id in this bank version, or None"""
+        return self._id_index.get(normalize_bank_key(exam_type, subject), {}).get(question_id)
+
+    def question_bytes(self, exam_type, subject, index, fields=None):
+        """Encoded question in one of STORED_QUESTION_PROJECTIONS (the full form when fields is None)"""
+        if fields is None or fields == QUESTION_FIELDS:
+            fragments = self._fragments
+        elif fields == EXAM_QUESTION_FIELDS:
+            fragments = self._exam_fragments
+        else:
+            raise ValueError(f"Fields {fields} are not a stored projection")
+        return fragments[normalize_bank_key(exam_type, subject)][index]
 
-        return data['questions']
+    def answer_key(self, exam_type, subject):
+        """Correct answers of a subject bank as one letter per question ('?' when missing)"""
+        questions = self._banks.get(normalize_bank_key(exam_type, subject), ())
+        return ''.join((q.get('correct_answer') or '?').upper()[:1] for q in questions)
 
-    except Exception as e:
-        logger.error(f"Error loading questions from {file_name}: {str(e)}")
-        return None
+    def summary(self):
+        return {
+            'source': 'json',
+            'version': self.version,
+            'loaded_at': self.loaded_at.isoformat(),
+            'errors': self.errors,
+            'banks': {f"{exam}_{subject}": self.count(exam, subject) for exam, subject in self._banks}
+        }
+
+# Compiled bank layout (little-endian):
+#   magic (8 bytes) | directory length (uint32) | directory JSON
+#   | per-bank offset tables (uint64, count + 1 entries each) | question JSON blobs
+# Every bank has two offset tables: the full questions and the exam projection
+# (EXAM_QUESTION_FIELDS). The directory maps "{exam}_{subject}" to both table
+# positions, question count, question ids, answer key and section index; offsets
+# are relative to the start of the blob region.
+COMPILED_BANK_MAGIC = b'MSHQBNK5'
+COMPILED_BANK_PATH = os.environ.get(
+    'QUESTION_BANK_ARTIFACT',
+    os.path.join(QUESTIONS_DIR, 'compiled', 'question_bank.msqb')
+)
+
+def compile_question_bank(questions_dir, output_path):
+    """Compile every question file into one memory-mappable artifact - refuses invalid banks"""
+    source = QuestionBank.load(questions_dir)
+    if source.errors:
+        raise ValueError(f"{len(source.errors)} invalid question files: {', '.join(sorted(source.errors))}")
+
+    directory = {'version': source.version, 'banks': {}}
+    tables = []
+    blobs = []
+    blob_offset = 0
+
+    for exam, subject in sorted(source.keys()):
+        count = source.count(exam, subject)
+        table_positions = []
+        for fields in STORED_QUESTION_PROJECTIONS:
+            table_positions.append(len(tables))
+            tables.append(blob_offset)
+            for index in range(count):
+                blob = source.question_bytes(exam, subject, index, fields)
+                blobs.append(blob)
+                blob_offset += len(blob)
+                tables.append(blob_offset)
+
+        directory['banks'][f"{exam}_{subject}"] = {
+            'table': table_positions[0],
+            'exam_table': table_positions[1],
+            'count': count,
+            'ids': source.question_ids(exam, subject),
+            'answer_key': source.answer_key(exam, subject),
+            'sections': {
+                section: indices.tolist() for section, indices in source.section_index(exam, subject).items()
+            }
+        }
+
+    directory_bytes = json_dumps_bytes(directory)
+    # Pad the header so the uint64 tables are 8-byte aligned
+    header_length = len(COMPILED_BANK_MAGIC) + 4 + len(directory_bytes)
+    directory_bytes += b' ' * (-header_length % 8)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(COMPILED_BANK_MAGIC)
+        f.write(struct.pack('<I', len(directory_bytes)))
+        f.write(directory_bytes)
+        f.write(struct.pack(f'<{len(tables)}Q', *tables))
+        for blob in blobs:
+            f.write(blob)
+
+    # Atomic replace: workers that already mapped the old file keep reading it
+    os.replace(temp_path, output_path)
+    logger.info(f"Compiled question bank {source.version} to {output_path} "
+                f"({len(directory['banks'])} subject banks, {len(blobs) // len(STORED_QUESTION_PROJECTIONS)} questions)")
+    return directory
+
+class CompiledQuestionBank:
+    """
+    Read-only view over a compiled bank artifact. The file is memory-mapped, so
+    every worker shares one copy through the OS page cache - both stored
+    projections included; only the questions a request actually selects are decoded.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(COMPILED_BANK_MAGIC)] != COMPILED_BANK_MAGIC:
+            raise ValueError(f"Not a compiled question bank: {path}")
+
+        header_start = len(COMPILED_BANK_MAGIC)
+        directory_length = struct.unpack_from('<I', self._mmap, header_start)[0]
+        directory_start = header_start + 4
+        directory = json_loads(self._mmap[directory_start:directory_start + directory_length])
+
+        table_start = directory_start + directory_length
+        table_entries = sum(
+            (bank['count'] + 1) * len(STORED_QUESTION_PROJECTIONS) for bank in directory['banks'].values()
+        )
+        # Zero-copy uint64 view over every offset table
+        self._offsets = memoryview(self._mmap)[table_start:table_start + table_entries * 8].cast('Q')
+        self._data_start = table_start + table_entries * 8
+
+        self._banks = {}
+        self._answer_keys = {}
+        self._sections = {}
+        self._ids = {}
+        self._id_index = {}
+        for name, bank in directory['banks'].items():
+            exam, subject = name.split('_', 1)
+            self._banks[(exam, subject)] = (bank['table'], bank['count'], bank['exam_table'])
+            self._ids[(exam, subject)] = bank['ids']
+            self._id_index[(exam, subject)] = {question_id: i for i, question_id in enumerate(bank['ids'])}
+            self._answer_keys[(exam, subject)] = bank['answer_key']
+            self._sections[(exam, subject)] = {
+                section: np.array(indices, dtype=np.intp) for section, indices in bank['sections'].items()
+            }
+
+        self.path = path
+        self.version = directory['version']
+        self.errors = {}
+        self.loaded_at = datetime.utcnow()
+
+    def keys(self):
+        return list(self._banks.keys())
+
+    def count(self, exam_type, subject):
+        bank = self._banks.get(normalize_bank_key(exam_type, subject))
+        return bank[1] if bank else 0
+
+    def question_bytes(self, exam_type, subject, index, fields=None):
+        table, count, exam_table = self._banks[normalize_bank_key(exam_type, subject)]
+        if fields == EXAM_QUESTION_FIELDS:
+            table = exam_table
+        elif fields is not None and fields != QUESTION_FIELDS:
+            raise ValueError(f"Fields {fields} are not a stored projection")
+        if not 0 <= index < count:
+            raise IndexError(f"Question index {index} out of range for {exam_type}_{subject}")
+        start = self._data_start + self._offsets[table + index]
+        end = self._data_start + self._offsets[table + index + 1]
+        return self._mmap[start:end]
+
+    def questions_at(self, exam_type, subject, indices):
+        return [json_loads(self.question_bytes(exam_type, subject, i)) for i in indices]
+
+    def answer_key(self, exam_type, subject):
+        return self._answer_keys.get(normalize_bank_key(exam_type, subject), '')
+
+    def section_index(self, exam_type, subject):
+        return self._sections.get(normalize_bank_key(exam_type, subject), {})
+
+    def question_ids(self, exam_type, subject):
+        return self._ids.get(normalize_bank_key(exam_type, subject), [])
+
+    def index_of(self, exam_type, subject, question_id):
+        return self._id_index.get(normalize_bank_key(exam_type, subject), {}).get(question_id)
+
+    def summary(self):
+        return {
+            'source': 'compiled',
+            'path': self.path,
+            'version': self.version,
+            'loaded_at': self.loaded_at.isoformat(),
+            'banks': {f"{exam}_{subject}": bank[1] for (exam, subject), bank in self._banks.items()}
+        }
+
+def load_question_bank():
+    """
+    Map the compiled artifact when it matches questions/, else parse the JSON files.
+    With QUESTION_BANK_STRICT set, an invalid question file stops the worker from starting.
+    """
+    if os.path.exists(COMPILED_BANK_PATH):
+        try:
+            bank = CompiledQuestionBank(COMPILED_BANK_PATH)
+            if bank.version == question_sources_digest(QUESTIONS_DIR):
+                logger.info(f"Question bank {bank.version} mapped from {COMPILED_BANK_PATH}")
+                return bank
+            logger.warning(f"Compiled question bank {bank.version} is stale - run 'flask compile-questions'")
+        except Exception as e:
+            logger.error(f"Error mapping compiled question bank: {str(e)}")
+
+    bank = QuestionBank.load(QUESTIONS_DIR)
+    if bank.errors and QUESTION_BANK_STRICT:
+        raise ValueError(f"Invalid question files: {', '.join(sorted(bank.errors))} - run 'flask validate-questions'")
+    return bank
+
+# Seconds between checks for changed bank sources; 0 turns the check off
+QUESTION_BANK_CHECK_INTERVAL = float(os.environ.get('QUESTION_BANK_CHECK_INTERVAL', 10))
+
+def question_bank_stamp():
+    """Cheap change marker for the bank sources - stat() of the artifact and question files, nothing is read"""
+    paths = [COMPILED_BANK_PATH] + sorted(
+        os.path.join(QUESTIONS_DIR, name) for name in os.listdir(QUESTIONS_DIR) if name.endswith('.json')
+    )
+    stamp = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        stamp.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(stamp)
+
+_question_bank_lock = threading.Lock()
+_question_bank_stamp = question_bank_stamp()
+_question_bank_checked_at = time.monotonic()
+question_bank = load_question_bank()
 
-def calculate_subject_weights(selected_subjects, exam_type):
+def get_question_bank():
+    """
+    Return the current question bank (safe to hold for the whole request).
+    Every QUESTION_BANK_CHECK_INTERVAL seconds the sources are stat()ed; when they
+    changed - a recompile, or a reload done through another worker - this worker
+    reloads too, so a swap reaches every worker without a restart.
+    """
+    global _question_bank_checked_at
+    if QUESTION_BANK_CHECK_INTERVAL > 0 and time.monotonic() - _question_bank_checked_at >= QUESTION_BANK_CHECK_INTERVAL:
+        # Only one request per worker checks; the others keep serving the current bank
+        if _question_bank_lock.acquire(blocking=False):
+            try:
+                _question_bank_checked_at = time.monotonic()
+                if question_bank_stamp() != _question_bank_stamp:
+                    logger.info("Question bank sources changed - reloading")
+                    _swap_question_bank()
+            except Exception as e:
+                logger.error(f"Question bank change check failed: {str(e)}")
+            finally:
+                _question_bank_lock.release()
+    return question_bank
+
+def _swap_question_bank():
+    # Caller holds _question_bank_lock. The stamp is taken first, so a change made
+    # while loading is picked up by the next check.
+    global question_bank, _question_bank_stamp
+    _question_bank_stamp = question_bank_stamp()
+    new_bank = load_question_bank()
+    question_bank = new_bank
+    _subject_bundles.clear()
+    _projected_fragments.clear()
+    return new_bank
+
+def reload_question_bank():
+    """Load questions again and atomically swap in the new bank"""
+    with _question_bank_lock:
+        return _swap_question_bank()
+
+# Projected question fragments, keyed by (bank version, exam, subject, fields)
+_projected_fragments = {}
+
+def question_fragments(bank, exam_type, subject, fields=None):
+    """
+    Pre-encoded question fragments of one subject bank, projected to `fields`.
+    Stored projections come straight from the bank; any other projection is
+    encoded once per bank version and worker, the first time it is asked for.
+    """
+    exam_part, subject_part = normalize_bank_key(exam_type, subject)
+    count = bank.count(exam_part, subject_part)
+    if fields is None or fields in STORED_QUESTION_PROJECTIONS:
+        return [bank.question_bytes(exam_part, subject_part, i, fields) for i in range(count)]
+
+    cache_key = (bank.version, exam_part, subject_part, fields)
+    fragments = _projected_fragments.get(cache_key)
+    if fragments is None:
+        fragments = [
+            json_dumps_bytes(project_question(question, fields))
+            for question in bank.questions_at(exam_part, subject_part, range(count))
+        ]
+        _projected_fragments[cache_key] = fragments
+    return fragments
+
+# Per-subject bundles as (bytes or None, etag), keyed by (bank version, exam, subject, fields).
+# Bundles of stored projections keep only their ETag - the bytes are joined from the
+# bank's fragments on each call, so they stay in the shared artifact.
+_subject_bundles = {}
+
+def get_subject_bundle(exam_type, subject, bank=None, fields=EXAM_QUESTION_FIELDS, etag_only=False):
+    """
+    Return (bundle_bytes, etag) for one subject bank - bytes None with etag_only
+    once the ETag is known. The ETag is a hash of the bytes, so it only changes
+    when the subject's content does.
+    """
+    bank = bank or get_question_bank()
+    exam_part, subject_part = normalize_bank_key(exam_type, subject)
+    cache_key = (bank.version, exam_part, subject_part, fields)
+
+    bundle = _subject_bundles.get(cache_key)
+    if bundle is not None and (etag_only or bundle[0] is not None):
+        return bundle
+
+    count = bank.count(exam_part, subject_part)
+    if not count:
+        return None, None
+    header = json_dumps({'exam_type': exam_part, 'subject': subject_part, 'total_questions': count})
+    body = (header[:-1] + ',"questions":[').encode('utf-8') + b','.join(
+        question_fragments(bank, exam_part, subject_part, fields)
+    ) + b']}'
+    etag = bundle[1] if bundle is not None else hashlib.sha256(body).hexdigest()[:20]
+    _subject_bundles[cache_key] = (None if fields in STORED_QUESTION_PROJECTIONS else body, etag)
+    return body, etag
+
+def calculate_subject_weights(selected_subjects, exam_type, rng=random):
     """
     V5 FIX: Calculate weight for each subject based on exam type.
     - WAEC: English gets 5-10 questions (random 5,6,7,8,9,10)
@@ -270,9 +1367,9 @@ def calculate_subject_weights(selected_subjects, exam_type):
     # Different English weights based on exam type
     if 'english' in selected_subjects:
         if exam_type.upper() == 'WAEC':
-            english_weight = random.randint(5, 10)  # WAEC: 5-10 English questions
+            english_weight = rng.randint(5, 10)  # WAEC: 5-10 English questions
         else:  # JAMB
-            english_weight = random.randint(10, 15)  # JAMB: 10-15 English questions
+            english_weight = rng.randint(10, 15)  # JAMB: 10-15 English questions
     
     # Calculate remaining questions for other subjects
     remaining_questions = 60 - english_weight
@@ -296,7 +1393,7 @@ def calculate_subject_weights(selected_subjects, exam_type):
         
         # Distribute extra questions randomly
         subjects_list = other_subjects.copy()
-        random.shuffle(subjects_list)
+        rng.shuffle(subjects_list)
         
         for i in range(extra_questions):
             if i < len(subjects_list):
@@ -308,81 +1405,613 @@ def calculate_subject_weights(selected_subjects, exam_type):
     logger.info(f"Subject weights for {exam_type}: {subject_weights}")
     return subject_weights
 
-def select_questions_for_subject(questions, required_count):
-    """Select required number of questions from available pool"""
-    if len(questions) <= required_count:
-        return questions.copy()
-    
-    # Shuffle and select required count
-    shuffled = questions.copy()
-    random.shuffle(shuffled)
-    return shuffled[:required_count]
+def allocate_by_section(section_counts, required_count, rng=random):
+    """
+    Split required_count across sections in proportion to their size (largest
+    remainder). Leftover seats go to sections drawn by their fractional share,
+    so small sections still get picked now and then.
+    """
+    total = sum(section_counts.values())
+    if total <= required_count:
+        return dict(section_counts)
+
+    allocation = {}
+    remainders = {}
+    for section, count in section_counts.items():
+        share = required_count * count / total
+        allocation[section] = int(share)
+        remainders[section] = share - int(share)
+
+    leftover = required_count - sum(allocation.values())
+    # Weighted sampling without replacement (Efraimidis-Spirakis keys)
+    drawn = sorted(
+        (section for section, weight in remainders.items() if weight > 0),
+        key=lambda section: rng.random() ** (1 / remainders[section]),
+        reverse=True
+    )
+    for section in drawn[:leftover]:
+        allocation[section] += 1
+    return allocation
+
+def sample_subject_questions(bank, exam_type, subject, required_count, rng=random):
+    """Stratified sample of question indices for one subject, proportional to syllabus sections"""
+    sections = bank.section_index(exam_type, subject)
+    allocation = allocate_by_section({section: len(indices) for section, indices in sections.items()},
+                                     required_count, rng)
+    picked = []
+    for section, count in allocation.items():
+        indices = sections[section]
+        picked.extend(int(indices[i]) for i in rng.sample(range(len(indices)), count))
+    return picked
+
+def sample_section_questions(bank, exam_type, subject, section, count, rng=random):
+    """Up to `count` random question indices from one section (topic practice)"""
+    indices = bank.section_index(exam_type, subject).get(section)
+    if indices is None:
+        return []
+    return [int(indices[i]) for i in rng.sample(range(len(indices)), min(count, len(indices)))]
+
+def question_ref(subject, question_id):
+    """Stable reference to a question - "subject#id" (ids are unique within a subject bank)"""
+    return f"{subject}#{question_id}"
+
+def split_question_ref(ref):
+    """
+    (subject, kind, value) of a reference: kind 'id' for "subject#id", 'index'
+    for the legacy positional "subject:index" form
+    """
+    if '#' in ref:
+        subject, question_id = ref.split('#', 1)
+        return subject, 'id', int(question_id)
+    subject, index = ref.split(':', 1)
+    return subject, 'index', int(index)
+
+def locate_question_refs(exam_type, refs, bank=None, bank_version=None):
+    """
+    (subject, bank index) per reference, the index None where the bank cannot
+    resolve it. Id references resolve in any bank version that still has the
+    question; legacy positional ones only in the version they were issued from.
+    """
+    bank = bank or get_question_bank()
+    located = []
+    for ref in refs:
+        subject, kind, value = split_question_ref(ref)
+        if kind == 'id':
+            index = bank.index_of(exam_type, subject, value)
+        elif bank_version == bank.version and 0 <= value < bank.count(exam_type, subject):
+            index = value
+        else:
+            index = None
+        located.append((subject, index))
+    return located
 
-def get_questions_for_exam(exam_type, selected_subjects):
+def get_questions_for_exam(exam_type, selected_subjects, rng=random, bank=None):
     """
     V5 FIX: Get exactly 60 questions with proper subject distribution.
     Different English question counts for WAEC (5-10) and JAMB (10-15).
+    Returns question references ("subject#id") - see locate_question_refs.
+    Every random choice comes from rng, so a seeded rng reproduces the same paper.
     """
-    all_questions = []
+    all_refs = []
+    bank = bank or get_question_bank()
+    selected_subjects = [s.lower() for s in selected_subjects]
+    used_indices = {}
     
     # Calculate how many questions each subject should get
-    subject_weights = calculate_subject_weights([s.lower() for s in selected_subjects], exam_type)
+    subject_weights = calculate_subject_weights(selected_subjects, exam_type, rng)
     
-    # Load questions for each subject according to weights
+    # Sample question indices for each subject without replacement, stratified by section
     for subject, required_count in subject_weights.items():
-        questions = load_questions_from_file(exam_type, subject)
+        available = bank.count(exam_type, subject)
         
-        if not questions:
+        if not available:
             logger.warning(f"No questions found for {subject}, trying to load from other subjects")
             continue
         
-        # Select required number of questions
-        selected = select_questions_for_subject(questions, required_count)
+        indices = sample_subject_questions(bank, exam_type, subject, required_count, rng)
+        used_indices[subject] = set(indices)
         
-        if len(selected) < required_count:
-            logger.warning(f"Only {len(selected)} questions available for {subject}, expected {required_count}")
+        if len(indices) < required_count:
+            logger.warning(f"Only {len(indices)} questions available for {subject}, expected {required_count}")
         
-        all_questions.extend(selected)
+        ids = bank.question_ids(exam_type, subject)
+        all_refs.extend(question_ref(subject, ids[i]) for i in indices)
     
     # If we still don't have 60 questions, try to fill from available subjects
-    if len(all_questions) < 60:
-        logger.warning(f"Only {len(all_questions)} questions loaded, trying to fill to 60")
+    if len(all_refs) < 60:
+        logger.warning(f"Only {len(all_refs)} questions loaded, trying to fill to 60")
         
         # Try to get more questions from available subjects
         for subject in selected_subjects:
-            if len(all_questions) >= 60:
+            needed = 60 - len(all_refs)
+            if needed <= 0:
                 break
-                
-            subject_lower = subject.lower()
-            questions = load_questions_from_file(exam_type, subject_lower)
-            
-            if questions:
-                # Get questions we haven't used yet
-                used_questions = [q.get('question', '') for q in all_questions]
-                new_questions = [q for q in questions if q.get('question', '') not in used_questions]
-                
-                if new_questions:
-                    needed = 60 - len(all_questions)
-                    to_add = min(needed, len(new_questions))
-                    all_questions.extend(new_questions[:to_add])
+
+            used = used_indices.setdefault(subject, set())
+            unused = [i for i in range(bank.count(exam_type, subject)) if i not in used]
+            extra = rng.sample(unused, min(needed, len(unused)))
+            used.update(extra)
+            ids = bank.question_ids(exam_type, subject)
+            all_refs.extend(question_ref(subject, ids[i]) for i in extra)
     
     # Final shuffle
-    random.shuffle(all_questions)
+    rng.shuffle(all_refs)
     
     # Ensure exactly 60 questions
-    if len(all_questions) > 60:
-        all_questions = all_questions[:60]
+    if len(all_refs) > 60:
+        all_refs = all_refs[:60]
     
     # Log distribution for debugging
     subject_counts = {}
-    for question in all_questions:
-        subject = question.get('subject', 'unknown')
+    for ref in all_refs:
+        subject = split_question_ref(ref)[0]
         subject_counts[subject] = subject_counts.get(subject, 0) + 1
     
     logger.info(f"Final question distribution for {exam_type}: {subject_counts}")
-    logger.info(f"Total questions: {len(all_questions)}")
+    logger.info(f"Total questions: {len(all_refs)}")
     
-    return all_questions
+    return all_refs
+
+def normalize_subjects(subjects):
+    """Canonical subject list - the same selection always generates from the same input"""
+    return sorted({str(subject).strip().lower() for subject in subjects})
+
+def generate_exam_paper(exam_type, subjects, seed=None, bank=None):
+    """
+    Generate a paper from (exam_type, subjects, seed). The same inputs on the same
+    bank version always give the same references, so a paper can be rebuilt from
+    its seed alone.
+    """
+    bank = bank or get_question_bank()
+    if seed is None:
+        seed = random.getrandbits(32)
+    subjects = normalize_subjects(subjects)
+    return {
+        'exam_type': exam_type,
+        'subjects': subjects,
+        'seed': seed,
+        'bank_version': bank.version,
+        'refs': get_questions_for_exam(exam_type, subjects, random.Random(seed), bank)
+    }
+
+def question_refs_fragment(exam_type, refs, bank=None, fields=None):
+    """JSON array bytes of the referenced questions, joined from the bank's pre-encoded fragments"""
+    bank = bank or get_question_bank()
+    fragments = []
+    for ref, (subject, index) in zip(refs, locate_question_refs(exam_type, refs, bank)):
+        if index is None:
+            raise KeyError(f"Question {ref} is not in bank {bank.version}")
+        if fields is None or fields in STORED_QUESTION_PROJECTIONS:
+            fragments.append(bank.question_bytes(exam_type, subject, index, fields))
+        else:
+            fragments.append(question_fragments(bank, exam_type, subject, fields)[index])
+    return b'[' + b','.join(fragments) + b']'
+
+def resolve_question_refs(exam_type, refs, bank=None, bank_version=None):
+    """Turn references back into (shared, read-only) question dicts - None where a question is gone"""
+    bank = bank or get_question_bank()
+    return [
+        bank.questions_at(exam_type, subject, [index])[0] if index is not None else None
+        for subject, index in locate_question_refs(exam_type, refs, bank, bank_version)
+    ]
+
+def missing_question(ref):
+    """Stand-in for a referenced question the bank no longer has, so positions stay aligned"""
+    return {
+        'ref': ref,
+        'missing': True,
+        'question': 'This question is no longer in the question bank.',
+        'options': {},
+        'correct_answer': None,
+        'subject': split_question_ref(ref)[0]
+    }
+
+def upgrade_question_refs(result, bank=None):
+    """
+    Rewrite a result's legacy positional references as "subject#id" while the
+    bank they were issued from is still current. Returns the result's references.
+    """
+    bank = bank or get_question_bank()
+    refs = json_loads(result.question_refs)
+    if result.bank_version != bank.version or all(split_question_ref(ref)[1] == 'id' for ref in refs):
+        return refs
+
+    located = locate_question_refs(result.exam_type, refs, bank, result.bank_version)
+    refs = [
+        question_ref(subject, bank.question_ids(result.exam_type, subject)[index])
+        for subject, index in located
+    ]
+    result.question_refs = json_dumps(refs)
+    return refs
+
+def paper_answer_key(exam_type, refs, bank=None):
+    """Answer-key string for a paper, read from the bank's per-subject keys ('?' for a missing question)"""
+    bank = bank or get_question_bank()
+    subject_keys = {}
+    letters = []
+    for subject, index in locate_question_refs(exam_type, refs, bank):
+        if subject not in subject_keys:
+            subject_keys[subject] = bank.answer_key(exam_type, subject)
+        letters.append(subject_keys[subject][index] if index is not None else '?')
+    return ''.join(letters)
+
+# -------------------- SCORING ENGINE --------------------
+# Answers are encoded as uint8: A-D -> 1-4, anything else (unanswered, unknown) -> 0.
+# A key position of 0 can never be matched, so it never counts as correct.
+ANSWER_LETTERS = 'ABCD'
+_ANSWER_CODES = np.zeros(256, dtype=np.uint8)
+for _code, _letter in enumerate(ANSWER_LETTERS, start=1):
+    _ANSWER_CODES[ord(_letter)] = _code
+    _ANSWER_CODES[ord(_letter.lower())] = _code
+
+def encode_answer_key(letters):
+    """Encode an answer-key string such as "ABDA..." into a uint8 array"""
+    return _ANSWER_CODES[np.frombuffer(letters.encode('ascii', 'replace'), dtype=np.uint8)]
+
+def encode_answer_sheet(user_answers, length):
+    """Encode a {"position": "letter"} answer sheet into a uint8 array of the paper's length"""
+    sheet = np.zeros(length, dtype=np.uint8)
+    for position, answer in (user_answers or {}).items():
+        try:
+            index = int(position)
+        except (TypeError, ValueError):
+            continue
+        answer = str(answer)
+        if 0 <= index < length and len(answer) == 1 and ord(answer) < 256:
+            sheet[index] = _ANSWER_CODES[ord(answer)]
+    return sheet
+
+class PaperKey:
+    """
+    Answer key for one paper: the encoded key plus, per position, an index into
+    the paper's subject list. Built from an answer-key string and the paper's
+    question references, or from full question dicts for legacy results.
+    """
+
+    def __init__(self, key, subject_ids, subjects):
+        self.key = key
+        self.subject_ids = subject_ids
+        self.subjects = subjects
+
+    @classmethod
+    def from_refs(cls, refs, answer_key):
+        ref_subjects = [split_question_ref(ref)[0] for ref in refs]
+        subjects = sorted(set(ref_subjects))
+        lookup = {subject: i for i, subject in enumerate(subjects)}
+        subject_ids = np.fromiter((lookup[subject] for subject in ref_subjects), dtype=np.intp, count=len(refs))
+        return cls(encode_answer_key(answer_key), subject_ids, subjects)
+
+    @classmethod
+    def from_questions(cls, questions):
+        answer_key = ''.join((q.get('correct_answer') or '?').upper()[:1] for q in questions)
+        refs = [f"{q.get('subject', 'Unknown').lower()}:{i}" for i, q in enumerate(questions)]
+        return cls.from_refs(refs, answer_key)
+
+    def __len__(self):
+        return len(self.key)
+
+    def score(self, user_answers):
+        """Score one answer sheet - returns (correct, subject_scores)"""
+        sheet = encode_answer_sheet(user_answers, len(self))
+        correct = (sheet == self.key) & (self.key != 0)
+        subject_correct = np.bincount(self.subject_ids, weights=correct, minlength=len(self.subjects))
+        subject_total = np.bincount(self.subject_ids, minlength=len(self.subjects))
+        subject_scores = {
+            subject: {'total': int(subject_total[i]), 'correct': int(subject_correct[i])}
+            for i, subject in enumerate(self.subjects)
+        }
+        return int(correct.sum()), subject_scores
+
+def score_answer_sheets(keys, sheets, subject_ids, lengths, subject_count):
+    """
+    Score a batch of answer sheets at once (bulk regrading, analytics).
+    keys, sheets and subject_ids are (papers, positions) arrays padded with 0
+    past each paper's length. Returns (correct per paper, correct per paper and
+    subject, total per paper and subject).
+    """
+    papers, positions = keys.shape
+    valid = np.arange(positions) < np.asarray(lengths)[:, None]
+    correct = (sheets == keys) & (keys != 0) & valid
+
+    flat_ids = (subject_ids + np.arange(papers)[:, None] * subject_count)[valid]
+    subject_correct = np.bincount(flat_ids, weights=correct[valid], minlength=papers * subject_count)
+    subject_total = np.bincount(flat_ids, minlength=papers * subject_count)
+    return (
+        correct.sum(axis=1),
+        subject_correct.reshape(papers, subject_count).astype(np.int64),
+        subject_total.reshape(papers, subject_count)
+    )
+
+def grade_questions(questions, user_answers):
+    """Grade full question dicts (legacy results) - returns (correct, subject_scores)"""
+    if not questions:
+        return 0, {}
+    return PaperKey.from_questions(questions).score(user_answers)
+
+# -------------------- EXAM SESSIONS --------------------
+EXAM_SESSION_TTL = timedelta(hours=4)
+# Expired sessions deleted per issued paper - more than one, so purging outpaces new rows
+EXAM_SESSION_PURGE_BATCH = 50
+
+def expired_exam_session_ids(limit=EXAM_SESSION_PURGE_BATCH):
+    return db.session.query(TemporaryData.id).filter(
+        TemporaryData.expires_at < datetime.utcnow(),
+        TemporaryData.data_type == 'exam_session'
+    ).limit(limit)
+
+def purge_expired_exam_sessions(limit=EXAM_SESSION_PURGE_BATCH):
+    """Delete up to `limit` expired exam sessions (through the expires_at index); the caller commits"""
+    expired_ids = expired_exam_session_ids(limit)
+    return TemporaryData.query.filter(TemporaryData.id.in_(expired_ids)).delete(synchronize_session=False)
+
+def create_exam_session(user_id, paper):
+    """
+    Record the blueprint of an issued paper in TemporaryData so submit-exam can
+    score against the server's own answer key instead of client-sent questions.
+    The references are kept next to the seed because a reload mid-exam would
+    stop the seed from regenerating the same paper.
+    """
+    exam_id = str(uuid.uuid4())
+    blueprint = {
+        'user_id': user_id,
+        'exam_type': paper['exam_type'],
+        'subjects': paper['subjects'],
+        'bank_version': paper['bank_version'],
+        'seed': paper['seed'],
+        'refs': paper['refs'],
+        # One letter per position, read from the paper's own bank - keeps scoring
+        # exact even if the bank is reloaded mid-exam
+        'answer_key': paper['answer_key'],
+        'issued_at': datetime.utcnow().isoformat()
+    }
+    db.session.add(TemporaryData(
+        data_type='exam_session',
+        data_key=exam_id,
+        data_value=json_dumps(blueprint),
+        expires_at=datetime.utcnow() + EXAM_SESSION_TTL
+    ))
+    # Nothing else purges these rows; trimming on issue keeps pace with exam-day bursts
+    purge_expired_exam_sessions()
+    db.session.commit()
+    return exam_id
+
+def get_exam_session(exam_id, user_id):
+    """Load an unexpired exam session owned by user_id, returning (row, blueprint)"""
+    row = TemporaryData.query.filter_by(data_type='exam_session', data_key=str(exam_id)).first()
+    if not row or row.expires_at < datetime.utcnow():
+        return None, None
+
+    blueprint = json_loads(row.data_value)
+    if blueprint.get('user_id') != user_id:
+        return None, None
+    return row, blueprint
+
+# -------------------- PAPER POOL --------------------
+PAPER_POOL_SIZE = int(os.environ.get('PAPER_POOL_SIZE', 8))
+PAPER_POOL_MAX_KEYS = int(os.environ.get('PAPER_POOL_MAX_KEYS', 16))
+PAPER_POOL_INTERVAL = float(os.environ.get('PAPER_POOL_INTERVAL', 5))
+# Demand counts are halved this often, so yesterday's popular selections fade out
+PAPER_POOL_DEMAND_HALF_LIFE = float(os.environ.get('PAPER_POOL_DEMAND_HALF_LIFE', 600))
+
+def assemble_exam_paper(exam_type, subjects):
+    """
+    Generate a paper and join its questions' pre-encoded fragments, ready to be
+    handed out. No question is decoded or re-encoded; per-paper data (the
+    position -> reference list) travels separately from the shared fragments.
+    Questions and answer key are read from the bank the paper was generated
+    from, even if a reload swaps the bank in between.
+    """
+    bank = get_question_bank()
+    paper = generate_exam_paper(exam_type, subjects, bank=bank)
+
+    subject_counts = {}
+    for ref in paper['refs']:
+        subject = split_question_ref(ref)[0]
+        subject_counts[subject] = subject_counts.get(subject, 0) + 1
+
+    paper['questions_json'] = question_refs_fragment(exam_type, paper['refs'], bank, fields=EXAM_QUESTION_FIELDS)
+    paper['answer_key'] = paper_answer_key(exam_type, paper['refs'], bank)
+    paper['total_questions'] = len(paper['refs'])
+    paper['subject_distribution'] = subject_counts
+    return paper
+
+class PaperPool:
+    """
+    Per-worker pool of pre-assembled papers for the most requested
+    (exam_type, subjects) selections. A background thread keeps up to `size`
+    papers ready for each of the `max_keys` most popular selections, so a burst
+    of get-questions calls is served by popping a deque. An empty pool falls
+    back to assembling the paper on demand.
+    Only selections that produced a full 60-question paper count as demand, and
+    the counter is capped and decays, so junk selections cannot grow it.
+    """
+
+    def __init__(self, size, max_keys, interval, demand_half_life=PAPER_POOL_DEMAND_HALF_LIFE):
+        self.size = size
+        self.max_keys = max_keys
+        self.interval = interval
+        self.demand_half_life = demand_half_life
+        self._pools = {}
+        self._demand = Counter()
+        self._demand_decayed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def take(self, exam_type, subjects):
+        key = (str(exam_type).upper(), tuple(normalize_subjects(subjects)))
+        version = get_question_bank().version
+        paper = None
+
+        with self._lock:
+            pool = self._pools.get(key)
+            while pool and paper is None:
+                candidate = pool.popleft()
+                if candidate['bank_version'] == version:
+                    paper = candidate
+
+        paper = paper or assemble_exam_paper(*key)
+        if paper['total_questions'] == 60:
+            with self._lock:
+                self._demand[key] += 1
+                # Bounded: a flood of distinct selections only keeps the most requested
+                if len(self._demand) > self.max_keys * 4:
+                    self._demand = Counter(dict(self._demand.most_common(self.max_keys * 2)))
+
+            if self.size > 0:
+                self._start()
+                self._wakeup.set()
+
+        return paper
+
+    def _start(self):
+        # Started lazily so the thread is created inside the serving (forked) worker
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='paper-pool', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self._refill()
+            except Exception as e:
+                logger.error(f"Paper pool refill error: {str(e)}")
+
+    def _refill(self):
+        version = get_question_bank().version
+        with self._lock:
+            if time.monotonic() - self._demand_decayed_at >= self.demand_half_life:
+                self._demand_decayed_at = time.monotonic()
+                self._demand = Counter({key: n // 2 for key, n in self._demand.items() if n // 2})
+            popular = [key for key, _ in self._demand.most_common(self.max_keys)]
+            # Forget selections that are no longer popular and papers from an old bank
+            self._pools = {
+                key: deque((p for p in self._pools.get(key, ()) if p['bank_version'] == version), maxlen=self.size)
+                for key in popular
+            }
+
+        for key in popular:
+            while True:
+                with self._lock:
+                    pool = self._pools.get(key)
+                    if pool is None or len(pool) >= self.size:
+                        break
+                paper = assemble_exam_paper(*key)
+                with self._lock:
+                    if key in self._pools:
+                        self._pools[key].append(paper)
+
+    def summary(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'ready': {f"{exam}:{','.join(subjects)}": len(pool) for (exam, subjects), pool in self._pools.items()}
+            }
+
+paper_pool = PaperPool(PAPER_POOL_SIZE, PAPER_POOL_MAX_KEYS, PAPER_POOL_INTERVAL)
+
+# -------------------- ADMIN STATS SNAPSHOT --------------------
+ADMIN_STATS_TTL = float(os.environ.get('ADMIN_STATS_TTL', 30))
+# Shared by every worker on the host; invalidate() rewrites it, get() reads it
+ADMIN_STATS_STAMP_PATH = os.environ.get('ADMIN_STATS_STAMP', os.path.join(app.instance_path, 'admin_stats.stamp'))
+
+def compute_admin_stats():
+    """Every dashboard counter in one aggregate query per table"""
+    now = datetime.utcnow()
+    week_ago = now - timedelta(days=7)
+
+    def count_where(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    users = db.session.query(
+        func.count(User.id),
+        count_where(User.is_activated == True),
+        count_where(User.created_at >= week_ago),
+        count_where(and_(User.is_activated == False, User.trial_start < now - timedelta(hours=1)))
+    ).one()
+    users_with_browser_data = db.session.query(func.count()).select_from(Payload).filter(
+        Payload.owner_type == 'user', Payload.kind == 'browser_data'
+    ).scalar()
+    codes = db.session.query(
+        func.count(ActivationCode.id),
+        count_where(ActivationCode.is_used == True)
+    ).one()
+    exams = db.session.query(
+        func.count(ExamResult.id),
+        count_where(ExamResult.created_at >= week_ago),
+        count_where(ExamResult.browser_synced == True)
+    ).one()
+
+    return {
+        'total_users': users[0],
+        'activated_users': users[1],
+        'active_trials': users[0] - users[1],
+        'expired_trials': users[3],
+        'total_codes': codes[0],
+        'used_codes': codes[1],
+        'total_exams': exams[0],
+        'recent_users': users[2],
+        'recent_exams': exams[1],
+        'users_with_browser_data': users_with_browser_data,
+        'browser_synced_results': exams[2]
+    }
+
+class StatsSnapshot:
+    """
+    Cached result of an expensive read, recomputed at most once per TTL.
+    Each worker keeps its own copy; writes that admins expect to see at once
+    call invalidate(), which rewrites a generation stamp file every worker
+    checks, so all of them recompute on their next read. Everything else
+    (e.g. exam submissions at peak) shows up when the snapshot expires.
+    """
+
+    def __init__(self, compute, ttl, stamp_path):
+        self._compute = compute
+        self.ttl = ttl
+        self.stamp_path = stamp_path
+        self._lock = threading.Lock()
+        self._value = None
+        self._stamp = None
+        self._computed_at = 0.0
+        self._generated_at = None
+
+    def _read_stamp(self):
+        try:
+            with open(self.stamp_path, 'r') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def get(self):
+        """Return (value, generated_at) - only one request recomputes an expired snapshot"""
+        stamp = self._read_stamp()
+        with self._lock:
+            if (self._value is None or stamp != self._stamp
+                    or time.monotonic() - self._computed_at >= self.ttl):
+                self._value = self._compute()
+                self._stamp = stamp
+                self._computed_at = time.monotonic()
+                self._generated_at = datetime.utcnow()
+            return self._value, self._generated_at
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+        try:
+            # Atomic replace, so a reader never sees a half-written stamp
+            os.makedirs(os.path.dirname(self.stamp_path), exist_ok=True)
+            temp_path = f"{self.stamp_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                f.write(uuid.uuid4().hex)
+            os.replace(temp_path, self.stamp_path)
+        except OSError as e:
+            logger.error(f"Error writing stats stamp: {str(e)}")
+
+admin_stats_snapshot = StatsSnapshot(compute_admin_stats, ADMIN_STATS_TTL, ADMIN_STATS_STAMP_PATH)
 
 def cleanup_old_data():
     """Auto-delete non-important data after 30 days"""
@@ -414,13 +2043,109 @@ def get_device_id():
         session['device_id'] = device_id
     return device_id
 
+# -------------------- ACTIVITY WRITE-BEHIND --------------------
+# Seconds between flushes; 0 writes every update through immediately
+ACTIVITY_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', 5))
+
+class ActivityBuffer:
+    """
+    Per-worker write-behind buffer for activity timestamps and trial timer
+    heartbeats. Updates are coalesced per user / session in memory and written
+    by a background thread in one executemany UPDATE per table, so heartbeats
+    no longer take the database write lock one request at a time. Pending
+    updates are also flushed when the worker exits.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._users = {}      # user_id -> last_activity
+        self._sessions = {}   # session_id -> (user_id, trial_elapsed_seconds, updated_at)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def touch(self, user_id, at=None):
+        at = at or datetime.utcnow()
+        with self._lock:
+            self._touch(user_id, at)
+        self._written()
+
+    def heartbeat(self, user_id, session_id, elapsed_seconds, at=None):
+        at = at or datetime.utcnow()
+        with self._lock:
+            self._touch(user_id, at)
+            if session_id is not None:
+                self._sessions[session_id] = (user_id, elapsed_seconds, at)
+        self._written()
+
+    def _touch(self, user_id, at):
+        # Caller holds the lock; keep the newest timestamp
+        if at > self._users.get(user_id, datetime.min):
+            self._users[user_id] = at
+
+    def _written(self):
+        if self.interval <= 0:
+            self.flush()
+        else:
+            self._start()
+
+    def _start(self):
+        # Started lazily so the thread is created inside the serving (forked) worker
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='activity-flush', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        """Write all pending updates in one transaction; they are re-queued if it fails"""
+        with self._lock:
+            users, self._users = self._users, {}
+            sessions, self._sessions = self._sessions, {}
+        if not users and not sessions:
+            return 0
+
+        try:
+            with app.app_context():
+                if users:
+                    user_table = User.__table__
+                    db.session.execute(
+                        user_table.update().where(user_table.c.id == bindparam('target_id'))
+                        .values(last_activity=bindparam('at')),
+                        [{'target_id': user_id, 'at': at} for user_id, at in users.items()]
+                    )
+                if sessions:
+                    session_table = UserSession.__table__
+                    db.session.execute(
+                        session_table.update().where(session_table.c.id == bindparam('target_id'))
+                        .values(trial_elapsed_seconds=bindparam('elapsed'), last_timer_update=bindparam('at'),
+                                last_activity=bindparam('at')),
+                        [{'target_id': session_id, 'elapsed': elapsed, 'at': at}
+                         for session_id, (_, elapsed, at) in sessions.items()]
+                    )
+                db.session.commit()
+        except Exception as e:
+            logger.error(f"Activity flush error: {str(e)}")
+            with self._lock:
+                for user_id, at in users.items():
+                    self._users.setdefault(user_id, at)
+                for session_id, pending in sessions.items():
+                    self._sessions.setdefault(session_id, pending)
+            return 0
+
+        return len(users) + len(sessions)
+
+activity_buffer = ActivityBuffer(ACTIVITY_FLUSH_INTERVAL)
+atexit.register(activity_buffer.flush)
+
 def update_user_activity(user_id):
-    """Update user's last activity timestamp"""
+    """Record user activity; the timestamp is written by the next activity flush"""
     try:
-        user = User.query.get(user_id)
-        if user:
-            user.last_activity = datetime.utcnow()
-            db.session.commit()
+        activity_buffer.touch(user_id)
     except Exception as e:
         logger.error(f"Error updating user activity: {str(e)}")
 
@@ -504,6 +2229,7 @@ def register():
 
         db.session.add(new_user)
         db.session.commit()
+        admin_stats_snapshot.invalidate()
 
         logger.info(f"New user registered: {email} (Admin: {is_admin})")
 
@@ -558,6 +2284,7 @@ def login():
             session['is_admin'] = user.is_admin
             session['device_id'] = user.device_id
             session.permanent = True
+            issue_trial_claim(user)
 
             logger.info(f"User logged in: {email} (Admin: {user.is_admin}, Status: {access_status['status']})")
 
@@ -613,16 +2340,18 @@ def user_status():
             session.clear()
             return jsonify({'active': False})
 
-        # V5.2 FIX: Use new access status check
-        access_status = check_access_status(user)
+        # V5.2 FIX: Use new access status check (and refresh the signed trial claim)
+        claim = issue_trial_claim(user)
+        access_status = claim_access_status(claim)
         
         session['is_activated'] = user.is_activated
         session['is_admin'] = user.is_admin
 
         # Calculate remaining trial time if in trial
         remaining_seconds = 0
-        if access_status['status'] == 'trial' and user.trial_end:
-            remaining_seconds = max(0, int((user.trial_end - datetime.utcnow()).total_seconds()))
+        trial_start, trial_end = claim_trial_window(claim)
+        if access_status['status'] == 'trial' and trial_end:
+            remaining_seconds = max(0, int((trial_end - datetime.utcnow()).total_seconds()))
         
         if access_status['status'] == 'activated':
             return jsonify({
@@ -672,12 +2401,12 @@ def user_stats():
             return jsonify({'success': False, 'message': 'Please login first!'})
 
         # V5.2 FIX: Check if user has access
-        user = User.query.get(session['user_id'])
-        if not user:
+        claim = current_trial_claim()
+        if not claim:
             return jsonify({'success': False, 'message': 'User not found!'})
             
-        access_status = check_access_status(user)
-        if not access_status['has_access'] and not user.is_activated:
+        access_status = claim_access_status(claim)
+        if not access_status['has_access'] and not claim['activated']:
             return jsonify({
                 'success': False, 
                 'message': 'Your trial has expired. Please activate your account to access statistics.',
@@ -699,49 +2428,33 @@ def user_recent_activity():
             return jsonify({'success': False, 'message': 'Please login first!'})
 
         # V5.2 FIX: Check if user has access
-        user = User.query.get(session['user_id'])
-        if not user:
+        claim = current_trial_claim()
+        if not claim:
             return jsonify({'success': False, 'message': 'User not found!'})
             
-        access_status = check_access_status(user)
-        if not access_status['has_access'] and not user.is_activated:
+        access_status = claim_access_status(claim)
+        if not access_status['has_access'] and not claim['activated']:
             return jsonify({
                 'success': False, 
                 'message': 'Your trial has expired. Please activate your account to view recent activity.',
                 'requires_activation': True
             })
 
-        # V5.1 FIX: Use distinct to get unique activities and order by most recent
-        recent_exams = ExamResult.query.filter_by(
-            user_id=session['user_id']
-        ).order_by(ExamResult.created_at.desc()).all()
-
-        # Use a dictionary to track unique activities based on multiple criteria
-        unique_activities = {}
-        activities = []
-        
-        for exam in recent_exams:
-            # Create a unique key based on exam characteristics to avoid duplicates
-            activity_key = f"{exam.exam_type}_{exam.subjects}_{exam.score}_{exam.total_questions}_{exam.created_at.strftime('%Y-%m-%d %H')}"
-            
-            # Only add if we haven't seen this activity before
-            if activity_key not in unique_activities:
-                unique_activities[activity_key] = True
-                
-                activities.append({
-                    'id': exam.id,
-                    'exam_type': exam.exam_type,
-                    'subjects': exam.subjects,
-                    'score': exam.score,
-                    'total_questions': exam.total_questions,
-                    'percentage': exam.percentage,
-                    'date': exam.created_at.isoformat(),
-                    'time_taken': exam.time_taken
-                })
-                
-                # Limit to 10 unique activities
-                if len(activities) >= 10:
-                    break
+        # V5.1 FIX: Most recent first - duplicates cannot be stored (unique fingerprint)
+        recent_exams = db.session.query(*RESULT_SUMMARY_COLUMNS).filter(
+            ExamResult.user_id == session['user_id']
+        ).order_by(ExamResult.created_at.desc()).limit(10).all()
+
+        activities = [{
+            'id': exam.id,
+            'exam_type': exam.exam_type,
+            'subjects': exam.subjects,
+            'score': exam.score,
+            'total_questions': exam.total_questions,
+            'percentage': exam.percentage,
+            'date': exam.created_at.isoformat(),
+            'time_taken': exam.time_taken
+        } for exam in recent_exams]
 
         logger.info(f"Returning {len(activities)} unique recent activities for user {session['user_id']}")
         
@@ -755,9 +2468,98 @@ def user_recent_activity():
         return jsonify({'success': False, 'message': 'Error loading recent activity'})
 
 # -------------------- LOCAL STORAGE SYNC API (V5 NEW FEATURE) --------------------
+def sync_exam_results(user_id, results):
+    """Insert offline exam results in one statement, skipping attempts already stored"""
+    rows = []
+    payloads = {}
+    for result_data in results:
+        taken_at = datetime.fromisoformat(result_data.get('date').replace('Z', '+00:00'))
+        if taken_at.tzinfo is not None:
+            taken_at = taken_at.astimezone(timezone.utc).replace(tzinfo=None)
+        fingerprint = result_fingerprint(
+            user_id, result_data.get('exam_type'), result_data.get('subjects'), result_data.get('score'),
+            result_data.get('total_questions'), taken_at=taken_at, exam_id=result_data.get('exam_id')
+        )
+        if fingerprint in payloads:
+            continue
+        payloads[fingerprint] = result_data
+        rows.append({
+            'user_id': user_id,
+            'exam_type': result_data.get('exam_type'),
+            'subjects': result_data.get('subjects'),
+            'score': result_data.get('score'),
+            'total_questions': result_data.get('total_questions'),
+            'percentage': result_data.get('percentage'),
+            'time_taken': result_data.get('time_taken'),
+            'created_at': taken_at,
+            'browser_synced': True,
+            'last_sync_time': datetime.utcnow(),
+            'fingerprint': fingerprint
+        })
+
+    # Looked up before the insert: a stats row built afterwards already counts the new results
+    stats = db.session.get(UserStats, user_id)
+    inserted_ids = insert_ignoring_duplicates(ExamResult, rows, 'fingerprint')
+    if not inserted_ids:
+        return 0
+
+    new_results = ExamResult.query.filter(ExamResult.id.in_(inserted_ids)).order_by(ExamResult.id).all()
+    payload_rows = []
+    for result in new_results:
+        result_data = payloads[result.fingerprint]
+        payload_rows.append(payload_row('exam_result', result.id, 'user_answers',
+                                        json_dumps_bytes(result_data.get('user_answers', {}))))
+        payload_rows.append(payload_row('exam_result', result.id, 'questions_data',
+                                        json_dumps_bytes(result_data.get('questions', []))))
+        if stats is not None:
+            apply_result_to_stats(stats, result)
+    if stats is None:
+        build_user_stats(user_id)
+    db.session.execute(Payload.__table__.insert(), payload_rows)
+    return len(new_results)
+
+def bump_sync_revision(user_id):
+    """Make clients holding the current browser data ETag refetch it"""
+    User.query.filter_by(id=user_id).update({User.sync_revision: func.coalesce(User.sync_revision, 0) + 1})
+
+def claim_sync_revision(user_id, seen):
+    """
+    Bump the sync revision only if it is still `seen`, in one conditional UPDATE.
+    False when another sync committed first - the caller's merge is then stale.
+    """
+    return User.query.filter(
+        User.id == user_id, func.coalesce(User.sync_revision, 0) == seen
+    ).update({User.sync_revision: seen + 1}, synchronize_session=False) == 1
+
+# Merges retried when another sync without If-Match wins the revision race
+SYNC_MERGE_ATTEMPTS = 3
+
+def browser_data_etag(user):
+    """Entity tag of a user's synced data; includes the user id so a shared browser never reuses another user's tag"""
+    return f"{user.id}.{user.sync_revision or 0}"
+
+def merge_browser_data(current, patch):
+    """Apply a client patch (changed keys; null deletes a key). Returns the merged dict and the changed keys."""
+    merged = dict(current)
+    changed = []
+    for key, value in patch.items():
+        if value is None:
+            if key in merged:
+                del merged[key]
+                changed.append(key)
+        elif merged.get(key) != value:
+            merged[key] = value
+            changed.append(key)
+    return merged, changed
+
 @app.route('/api/user/sync-browser-data', methods=['POST'])
 def sync_browser_data():
-    """V5: Sync localStorage data from browser to server"""
+    """
+    V5: Sync localStorage data from browser to server.
+    The body is a patch holding only the changed keys, merged into the stored data.
+    An If-Match revision that is no longer current is rejected with 412 - also when
+    another sync from the same revision commits while this one is merging.
+    """
     try:
         if 'user_id' not in session:
             return jsonify({'success': False, 'message': 'Please login first!'})
@@ -767,55 +2569,65 @@ def sync_browser_data():
         if not user:
             return jsonify({'success': False, 'message': 'User not found!'})
 
+        etag = browser_data_etag(user)
+        if request.if_match and not request.if_match.contains(etag):
+            response = jsonify({'success': False, 'message': 'Browser data changed on the server!', 'revision': etag})
+            response.set_etag(etag)
+            return response, 412
+
         data = request.get_json()
         if not data:
             return jsonify({'success': False, 'message': 'No data received!'})
 
-        # Store browser data
-        user.browser_data = json.dumps(data)
-        user.last_activity = datetime.utcnow()
-        
-        # Handle exam results sync with duplication check
-        if 'exam_results' in data and data['exam_results']:
-            try:
-                for result_data in data['exam_results']:
-                    # Check if result already exists using multiple criteria
-                    existing_result = ExamResult.query.filter_by(
-                        user_id=user.id,
-                        exam_type=result_data.get('exam_type'),
-                        subjects=result_data.get('subjects'),
-                        score=result_data.get('score'),
-                        total_questions=result_data.get('total_questions')
-                    ).first()
-                    
-                    if not existing_result:
-                        # Create new exam result from localStorage
-                        new_result = ExamResult(
-                            user_id=user.id,
-                            exam_type=result_data.get('exam_type'),
-                            subjects=result_data.get('subjects'),
-                            score=result_data.get('score'),
-                            total_questions=result_data.get('total_questions'),
-                            percentage=result_data.get('percentage'),
-                            time_taken=result_data.get('time_taken'),
-                            created_at=datetime.fromisoformat(result_data.get('date').replace('Z', '+00:00')),
-                            user_answers=json.dumps(result_data.get('user_answers', {})),
-                            questions_data=json.dumps(result_data.get('questions', [])),
-                            browser_synced=True,
-                            last_sync_time=datetime.utcnow()
-                        )
-                        db.session.add(new_result)
-            except Exception as e:
-                logger.error(f"Error syncing exam results: {str(e)}")
+        # A sync is activity even when nothing changed; the buffer writes it with the next flush
+        update_user_activity(user.id)
 
-        db.session.commit()
-        update_user_activity(session['user_id'])
-        
-        return jsonify({
+        for attempt in range(SYNC_MERGE_ATTEMPTS):
+            seen = user.sync_revision or 0
+            current = load_payload('user', user.id, 'browser_data', {}, inline=lambda: user.browser_data)
+            merged, changed = merge_browser_data(current if isinstance(current, dict) else {}, data)
+
+            # Nothing new - no write to the user row
+            if not changed:
+                break
+
+            # The revision is claimed before writing, so of two syncs merged from the
+            # same revision only one commits - the other never overwrites its keys
+            if claim_sync_revision(user.id, seen):
+                set_committed_value(user, 'sync_revision', seen + 1)
+                etag = browser_data_etag(user)
+                store_payload('user', user.id, 'browser_data', merged)
+
+                # Handle exam results sync - one conflict-ignoring insert; the fingerprint makes re-syncs no-ops
+                if 'exam_results' in changed and isinstance(merged.get('exam_results'), list):
+                    try:
+                        with db.session.begin_nested():
+                            sync_exam_results(user.id, merged['exam_results'])
+                    except Exception as e:
+                        logger.error(f"Error syncing exam results: {str(e)}")
+
+                db.session.commit()
+                break
+
+            # Lost the race: reload the winner's data, then reject (If-Match) or merge again
+            db.session.rollback()
+            etag = browser_data_etag(user)
+            if request.if_match:
+                response = jsonify({'success': False, 'message': 'Browser data changed on the server!', 'revision': etag})
+                response.set_etag(etag)
+                return response, 412
+        else:
+            return jsonify({'success': False, 'message': 'Browser data is busy, please sync again.', 'revision': etag}), 409
+
+        response = jsonify({
             'success': True,
             'message': 'Browser data synced successfully!',
+            'changed': changed,
+            'revision': etag,
             'sync_time': datetime.utcnow().isoformat()
         })
+        response.set_etag(etag)
+        return response
 
     except Exception as e:
         logger.error(f"Browser data sync error: {str(e)}")
@@ -823,7 +2635,7 @@ def sync_browser_data():
 
 @app.route('/api/user/get-browser-data')
 def get_browser_data():
-    """V5: Get browser data from server"""
+    """V5: Get browser data from server (304 when the client's If-None-Match revision is current)"""
     try:
         if 'user_id' not in session:
             return jsonify({'success': False, 'message': 'Please login first!'})
@@ -833,26 +2645,21 @@ def get_browser_data():
         if not user:
             return jsonify({'success': False, 'message': 'User not found!'})
 
-        browser_data = {}
-        if user.browser_data:
-            browser_data = json.loads(user.browser_data)
+        etag = browser_data_etag(user)
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        browser_data = load_payload('user', user.id, 'browser_data', {}, inline=lambda: user.browser_data)
 
-        # Get exam results for this user with uniqueness
-        exam_results = ExamResult.query.filter_by(user_id=user.id).order_by(ExamResult.created_at.desc()).limit(20).all()
+        # Get exam results for this user (unique by fingerprint)
+        exam_results = db.session.query(*RESULT_SUMMARY_COLUMNS).filter(
+            ExamResult.user_id == user.id
+        ).order_by(ExamResult.created_at.desc()).limit(20).all()
         
         results_data = []
-        seen_results = set()
-        
         for result in exam_results:
-            # Create a unique identifier for this result
-            result_key = f"{result.exam_type}_{result.subjects}_{result.score}_{result.total_questions}"
-            
-            # Skip if we've already seen this result
-            if result_key in seen_results:
-                continue
-                
-            seen_results.add(result_key)
-            
             results_data.append({
                 'id': result.id,
                 'exam_type': result.exam_type,
@@ -865,13 +2672,17 @@ def get_browser_data():
                 'browser_synced': result.browser_synced
             })
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'browser_data': browser_data,
             'exam_results': results_data,
             'last_activity': user.last_activity.isoformat() if user.last_activity else None,
-            'trial_end': user.trial_end.isoformat() if user.trial_end else None
+            'trial_end': user.trial_end.isoformat() if user.trial_end else None,
+            'revision': etag
         })
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
 
     except Exception as e:
         logger.error(f"Get browser data error: {str(e)}")
@@ -899,19 +2710,13 @@ def update_trial_timer():
         if not user:
             return jsonify({'success': False, 'message': 'User not found!'})
 
-        # Update trial timer in session
-        active_session = UserSession.query.filter_by(
+        # Update trial timer in session - heartbeats are buffered and flushed in batches
+        active_session_id = db.session.query(UserSession.id).filter_by(
             user_id=user.id,
             is_active=True
-        ).order_by(UserSession.login_time.desc()).first()
-
-        if active_session:
-            active_session.trial_elapsed_seconds = data.get('elapsed_seconds', 0)
-            active_session.last_timer_update = datetime.utcnow()
-            active_session.last_activity = datetime.utcnow()
+        ).order_by(UserSession.login_time.desc()).limit(1).scalar()
 
-        # Update user's last activity
-        user.last_activity = datetime.utcnow()
+        activity_buffer.heartbeat(user.id, active_session_id, data.get('elapsed_seconds', 0))
         
         # Calculate remaining trial time
         if user.trial_start and not user.is_activated:
@@ -919,11 +2724,10 @@ def update_trial_timer():
             elapsed_seconds = data.get('elapsed_seconds', 0)
             remaining_seconds = max(0, total_trial_seconds - elapsed_seconds)
             
-            # Update trial end time if needed
+            # Update trial end time if needed (the only heartbeat write that cannot wait)
             if not user.trial_end or user.trial_end < datetime.utcnow():
                 user.trial_end = datetime.utcnow() + timedelta(seconds=remaining_seconds)
-
-        db.session.commit()
+                db.session.commit()
         
         return jsonify({
             'success': True,
@@ -938,44 +2742,43 @@ def update_trial_timer():
 
 @app.route('/api/user/trial-status')
 def get_trial_status():
-    """V5: Get current trial status"""
+    """V5: Get current trial status - answered from the signed trial claim, the server clock is authoritative"""
     try:
         if 'user_id' not in session and 'device_id' in session:
             user = User.query.filter_by(device_id=session.get('device_id')).first()
             if not user:
                 return jsonify({'success': False, 'message': 'User not found!'})
+            claim = trial_claim_for(user)
         elif 'user_id' not in session:
             return jsonify({'success': False, 'message': 'Please login first!'})
         else:
-            user = User.query.get(session['user_id'])
-            if not user:
+            claim = current_trial_claim()
+            if not claim:
                 return jsonify({'success': False, 'message': 'User not found!'})
 
-        access_status = check_access_status(user)
+        access_status = claim_access_status(claim)
+        trial_start, trial_end = claim_trial_window(claim)
         remaining_seconds = 0
+        elapsed_seconds = 0
         
-        if user.trial_end and access_status['status'] == 'trial':
-            remaining_seconds = max(0, int((user.trial_end - datetime.utcnow()).total_seconds()))
-        
-        # Get active session timer
-        active_session = UserSession.query.filter_by(
-            user_id=user.id,
-            is_active=True
-        ).order_by(UserSession.login_time.desc()).first()
-        
-        elapsed_seconds = active_session.trial_elapsed_seconds if active_session else 0
+        if trial_start:
+            now = datetime.utcnow()
+            elapsed_seconds = min(claim['trial_seconds'], max(0, int((now - trial_start).total_seconds())))
+            if access_status['status'] == 'trial':
+                remaining_seconds = max(0, int((trial_end - now).total_seconds()))
         
         return jsonify({
             'success': True,
             'trial_active': access_status['status'] == 'trial',
             'trial_expired': access_status['status'] == 'expired',
-            'is_activated': user.is_activated,
+            'is_activated': claim['activated'],
             'remaining_seconds': remaining_seconds,
             'elapsed_seconds': elapsed_seconds,
-            'trial_start': user.trial_start.isoformat() if user.trial_start else None,
-            'trial_end': user.trial_end.isoformat() if user.trial_end else None,
+            'trial_start': trial_start.isoformat() if trial_start else None,
+            'trial_end': trial_end.isoformat() if trial_end else None,
             'status': access_status['status'],
-            'has_access': access_status.get('has_access', True)
+            'has_access': access_status.get('has_access', True),
+            'clock': 'server'
         })
 
     except Exception as e:
@@ -1018,8 +2821,10 @@ def activate_account():
         activation_code.used_at = datetime.utcnow()
 
         db.session.commit()
+        admin_stats_snapshot.invalidate()
 
         session['is_activated'] = True
+        issue_trial_claim(user)
 
         logger.info(f"User activated: {user.email} with code: {code}")
 
@@ -1040,13 +2845,13 @@ def start_exam():
         if 'user_id' not in session:
             return jsonify({'success': False, 'message': 'Please login first!'})
 
-        user = User.query.get(session['user_id'])
-        if not user:
+        claim = current_trial_claim()
+        if not claim:
             session.clear()
             return jsonify({'success': False, 'message': 'Session expired. Please login again.'})
 
         # V5.2 FIX: Check access status properly
-        access_status = check_access_status(user)
+        access_status = claim_access_status(claim)
         
         if not access_status['has_access']:
             return jsonify({
@@ -1074,11 +2879,11 @@ def get_questions():
             return jsonify({'success': False, 'message': 'Please login first!'})
 
         # V5.2 FIX: Check if user has access
-        user = User.query.get(session['user_id'])
-        if not user:
+        claim = current_trial_claim()
+        if not claim:
             return jsonify({'success': False, 'message': 'User not found!'})
             
-        access_status = check_access_status(user)
+        access_status = claim_access_status(claim)
         if not access_status['has_access']:
             return jsonify({
                 'success': False, 
@@ -1093,6 +2898,11 @@ def get_questions():
         if not exam_type or not subjects:
             return jsonify({'success': False, 'message': 'Exam type and subjects are required!'})
 
+        try:
+            fields = parse_question_fields(data.get('fields', request.args.get('fields')), EXAM_QUESTION_FIELDS)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
         # Validation
         if exam_type.upper() == 'WAEC' and len(subjects) != 9:
             return jsonify({
@@ -1120,63 +2930,188 @@ def get_questions():
                     'message': 'JAMB requires English Language as a compulsory subject.'
                 })
 
-        # V5 FIX: Use new question loading with proper English distribution
-        all_questions = get_questions_for_exam(exam_type, subjects)
+        # V5 FIX: Use new question loading with proper English distribution (pre-assembled when popular)
+        paper = paper_pool.take(exam_type, subjects)
 
-        if not all_questions:
+        if not paper['total_questions']:
             return jsonify({
                 'success': False, 
                 'message': 'No questions found for the selected subjects! Please try different subjects.'
             })
 
-        # Final check: Ensure we have exactly 60 questions
-        if len(all_questions) != 60:
-            logger.warning(f"Expected 60 questions, but got {len(all_questions)}. Adjusting...")
-            # Try to get more questions if we have less
-            if len(all_questions) < 60:
-                # Try to load additional questions from English (usually has many)
-                if 'english' in [s.lower() for s in subjects]:
-                    english_questions = load_questions_from_file(exam_type, 'english')
-                    if english_questions:
-                        used_questions = [q.get('question', '') for q in all_questions]
-                        new_questions = [q for q in english_questions 
-                                       if q.get('question', '') not in used_questions]
-                        needed = 60 - len(all_questions)
-                        to_add = min(needed, len(new_questions))
-                        all_questions.extend(new_questions[:to_add])
-            
-            # Final shuffle
-            random.shuffle(all_questions)
-            
-            # Ensure exactly 60
-            if len(all_questions) > 60:
-                all_questions = all_questions[:60]
+        if paper['total_questions'] != 60:
+            logger.warning(f"Expected 60 questions, but got {paper['total_questions']} for {exam_type} {subjects}")
+
+        logger.info(f"Loaded {paper['total_questions']} questions for {exam_type} - "
+                    f"Final distribution: {paper['subject_distribution']}")
+
+        exam_id = create_exam_session(session['user_id'], paper)
+
+        response_data = {
+            'success': True,
+            'exam_id': exam_id,
+            'total_questions': paper['total_questions'],
+            'subject_distribution': paper['subject_distribution'],
+            'exam_type': exam_type,
+            'message': f"Loaded {paper['total_questions']} questions with English distribution: WAEC=5-10, JAMB=10-15"
+        }
 
-        # Log final distribution
-        subject_counts = {}
-        for question in all_questions:
-            subject = question.get('subject', 'unknown')
-            subject_counts[subject] = subject_counts.get(subject, 0) + 1
+        if data.get('ids_only'):
+            # Client assembles the paper from its cached subject bundles, matching references by question id
+            if 'id' not in fields:
+                fields = tuple(field for field in QUESTION_FIELDS if field in fields or field == 'id')
+            bundles = {}
+            for subject in paper['subject_distribution']:
+                _, etag = get_subject_bundle(exam_type, subject, fields=fields, etag_only=True)
+                url_args = {'v': etag}
+                if fields != EXAM_QUESTION_FIELDS:
+                    url_args['fields'] = ','.join(fields)
+                bundles[subject] = {
+                    'url': url_for('get_question_bundle', exam_type=exam_type.lower(), subject=subject, **url_args),
+                    'etag': etag
+                }
+            response_data['question_refs'] = paper['refs']
+            response_data['bundles'] = bundles
+            return jsonify(response_data)
+
+        # Splice the pre-serialized questions into the response envelope; the client
+        # numbers questions by position, matching question_refs
+        response_data['question_refs'] = paper['refs']
+        if fields == EXAM_QUESTION_FIELDS:
+            questions_json = paper['questions_json']
+        else:
+            questions_json = question_refs_fragment(exam_type, paper['refs'], fields=fields)
+        return json_response_with_fragments(response_data, questions=questions_json)
 
-        logger.info(f"Loaded {len(all_questions)} questions for {exam_type} - Final distribution: {subject_counts}")
+    except Exception as e:
+        logger.error(f"Get questions error: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error loading questions: {str(e)}'})
+
+@app.route('/api/question-bundles/<exam_type>/<subject>')
+def get_question_bundle(exam_type, subject):
+    """
+    Whole subject bank for client-side caching. Answers If-None-Match with 304;
+    a URL carrying the current ETag as ?v= is immutable and cached without revalidation.
+    """
+    try:
+        if 'user_id' not in session:
+            return jsonify({'success': False, 'message': 'Please login first!'})
 
-        # V5 FIX: Add question IDs for frontend tracking
-        for i, question in enumerate(all_questions):
-            question['id'] = i
-            question['selected_answer'] = None
+        claim = current_trial_claim()
+        if not claim:
+            return jsonify({'success': False, 'message': 'User not found!'})
+
+        access_status = claim_access_status(claim)
+        if not access_status['has_access']:
+            return jsonify({
+                'success': False, 
+                'message': 'Your trial has expired. Please activate your account to access questions.',
+                'requires_activation': True
+            })
+
+        try:
+            fields = parse_question_fields(request.args.get('fields'), EXAM_QUESTION_FIELDS)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+        _, etag = get_subject_bundle(exam_type, subject, fields=fields, etag_only=True)
+        if etag is None:
+            return jsonify({'success': False, 'message': 'Question bank not found!'}), 404
+        # A revalidation hit is answered without joining the bundle
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+        else:
+            body, etag = get_subject_bundle(exam_type, subject, fields=fields)
+            response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        if request.args.get('v') == etag:
+            response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+        else:
+            response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
+
+    except Exception as e:
+        logger.error(f"Get question bundle error: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error loading question bundle.'})
+
+@app.route('/api/practice/<exam_type>/<subject>/sections')
+def get_practice_sections(exam_type, subject):
+    """Sections of a subject bank with their question counts, for topic practice"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'success': False, 'message': 'Please login first!'})
+
+        sections = get_question_bank().section_index(exam_type, subject)
+        if not sections:
+            return jsonify({'success': False, 'message': 'Question bank not found!'}), 404
 
         return jsonify({
             'success': True,
-            'questions': all_questions,
-            'total_questions': len(all_questions),
-            'subject_distribution': subject_counts,
             'exam_type': exam_type,
-            'message': f"Loaded {len(all_questions)} questions with English distribution: WAEC=5-10, JAMB=10-15"
+            'subject': subject,
+            'sections': {section: len(indices) for section, indices in sections.items()}
         })
 
     except Exception as e:
-        logger.error(f"Get questions error: {str(e)}")
-        return jsonify({'success': False, 'message': f'Error loading questions: {str(e)}'})
+        logger.error(f"Get practice sections error: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error loading sections.'})
+
+@app.route('/api/practice/questions', methods=['POST'])
+def get_practice_questions():
+    """Topic practice: N random questions from one section of a subject"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'success': False, 'message': 'Please login first!'})
+
+        claim = current_trial_claim()
+        if not claim:
+            return jsonify({'success': False, 'message': 'User not found!'})
+
+        access_status = claim_access_status(claim)
+        if not access_status['has_access']:
+            return jsonify({
+                'success': False, 
+                'message': 'Your trial has expired. Please activate your account to access questions.',
+                'requires_activation': True
+            })
+
+        data = request.get_json() or {}
+        exam_type = data.get('exam_type')
+        subject = data.get('subject')
+        section = data.get('section')
+        try:
+            count = max(1, min(int(data.get('count', 10)), 50))
+        except (TypeError, ValueError):
+            count = 10
+
+        if not exam_type or not subject or not section:
+            return jsonify({'success': False, 'message': 'Exam type, subject and section are required!'})
+
+        try:
+            fields = parse_question_fields(data.get('fields', request.args.get('fields')))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+        bank = get_question_bank()
+        indices = sample_section_questions(bank, exam_type, subject, section, count)
+        if not indices:
+            return jsonify({'success': False, 'message': 'No questions found for this section!'})
+
+        exam_part, subject_part = normalize_bank_key(exam_type, subject)
+        ids = bank.question_ids(exam_part, subject_part)
+        refs = [question_ref(subject_part, ids[i]) for i in indices]
+        return json_response_with_fragments({
+            'success': True,
+            'question_refs': refs,
+            'total_questions': len(refs),
+            'exam_type': exam_type,
+            'subject': subject,
+            'section': section
+        }, questions=question_refs_fragment(exam_part, refs, bank, fields))
+
+    except Exception as e:
+        logger.error(f"Get practice questions error: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error loading practice questions: {str(e)}'})
 
 @app.route('/api/submit-exam', methods=['POST'])
 def submit_exam():
@@ -1188,11 +3123,11 @@ def submit_exam():
             return jsonify({'success': False, 'message': 'Please login first!'})
 
         # V5.2 FIX: Check if user has access
-        user = User.query.get(session['user_id'])
-        if not user:
+        claim = current_trial_claim()
+        if not claim:
             return jsonify({'success': False, 'message': 'User not found!'})
             
-        access_status = check_access_status(user)
+        access_status = claim_access_status(claim)
         if not access_status['has_access']:
             return jsonify({
                 'success': False, 
@@ -1206,32 +3141,50 @@ def submit_exam():
         if not data:
             return jsonify({'success': False, 'message': 'No data received!'})
         
+        exam_id = data.get('exam_id')
         user_answers = data.get('user_answers', {})
-        questions = data.get('questions', [])
-        exam_type = data.get('exam_type', '')
-        subjects = data.get('subjects', [])
+        time_taken = data.get('time_taken', 0)
 
-        if not questions:
-            return jsonify({'success': False, 'message': 'No questions data!'})
+        if not exam_id:
+            return jsonify({'success': False, 'message': 'Exam session is required! Please restart the exam.'})
 
-        correct = 0
-        subject_scores = {}
+        exam_session, blueprint = get_exam_session(exam_id, session['user_id'])
+        if not blueprint:
+            return jsonify({'success': False, 'message': 'Exam session not found or expired! Please restart the exam.'})
 
-        # Calculate scores
-        for i, question in enumerate(questions):
-            user_answer = user_answers.get(str(i))
-            subject = question.get('subject', 'Unknown').lower()
+        exam_type = blueprint['exam_type']
+        subjects = blueprint['subjects']
+        refs = blueprint['refs']
+        answer_key = blueprint['answer_key']
 
-            if subject not in subject_scores:
-                subject_scores[subject] = {'total': 0, 'correct': 0}
+        # Re-submission of an already scored session (e.g. a retried request)
+        if blueprint.get('result_id'):
+            existing_result = ExamResult.query.get(blueprint['result_id'])
+            if existing_result:
+                logger.info(f"Exam session {exam_id} already submitted as result {existing_result.id}")
+                return jsonify({
+                    'success': True,
+                    'message': 'Exam submitted successfully!',
+                    'score': existing_result.score,
+                    'total_questions': existing_result.total_questions,
+                    'percentage': existing_result.percentage,
+                    'subject_scores': json_loads(existing_result.subject_scores or '{}'),
+                    'result_id': existing_result.id,
+                    'exam_type': exam_type,
+                    'subjects': subjects,
+                    'created_at': existing_result.created_at.isoformat(),
+                    'time_taken': existing_result.time_taken
+                })
 
-            subject_scores[subject]['total'] += 1
+        bank = get_question_bank()
+        if bank.version != blueprint.get('bank_version'):
+            logger.warning(f"Exam session {exam_id} issued on bank {blueprint.get('bank_version')}, "
+                           f"scoring with stored answer key (current bank {bank.version})")
 
-            if user_answer and user_answer.upper() == question.get('correct_answer', '').upper():
-                correct += 1
-                subject_scores[subject]['correct'] += 1
+        # Calculate scores against the server's answer key
+        correct, subject_scores = PaperKey.from_refs(refs, answer_key).score(user_answers)
 
-        total_questions = len(questions)
+        total_questions = len(refs)
         percentage = round((correct / total_questions) * 100, 2) if total_questions > 0 else 0
 
         # Save result to database with duplicate check
@@ -1243,13 +3196,23 @@ def submit_exam():
                 score=correct,
                 total_questions=total_questions,
                 percentage=percentage,
-                time_taken=data.get('time_taken', 0),
-                user_answers=json.dumps(user_answers),
-                questions_data=json.dumps(questions),
+                time_taken=time_taken,
+                bank_version=blueprint.get('bank_version'),
+                question_refs=json_dumps(refs),
+                subject_scores=json_dumps(subject_scores),
+                fingerprint=result_fingerprint(session['user_id'], exam_type, ','.join(subjects), correct,
+                                               total_questions, exam_id=exam_id),
                 last_sync_time=datetime.utcnow()
             )
 
             db.session.add(new_result)
+            db.session.flush()
+            store_payload('exam_result', new_result.id, 'user_answers', user_answers)
+            record_exam_result(new_result, subject_scores)
+            bump_sync_revision(session['user_id'])
+
+            blueprint['result_id'] = new_result.id
+            exam_session.data_value = json_dumps(blueprint)
             db.session.commit()
 
             logger.info(f"Exam submitted - User: {session['user_id']}, Type: {exam_type}, "
@@ -1257,12 +3220,10 @@ def submit_exam():
         except Exception as db_error:
             # If duplicate, find existing result
             logger.warning(f"Possible duplicate exam result: {str(db_error)}")
+            db.session.rollback()
             existing_result = ExamResult.query.filter_by(
-                user_id=session['user_id'],
-                exam_type=exam_type,
-                subjects=','.join(subjects),
-                score=correct,
-                total_questions=total_questions
+                fingerprint=result_fingerprint(session['user_id'], exam_type, ','.join(subjects), correct,
+                                               total_questions, exam_id=exam_id)
             ).first()
             
             if existing_result:
@@ -1282,7 +3243,7 @@ def submit_exam():
             'exam_type': exam_type,
             'subjects': subjects,
             'created_at': new_result.created_at.isoformat(),
-            'time_taken': data.get('time_taken', 0)
+            'time_taken': time_taken
         })
 
     except Exception as e:
@@ -1305,29 +3266,50 @@ def get_exam_result(result_id):
         if not user:
             return jsonify({'success': False, 'message': 'User not found!'})
 
-        result = ExamResult.query.filter_by(id=result_id, user_id=session['user_id']).first()
+        try:
+            fields = parse_question_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+        result = ExamResult.query.options(undefer_group('detail')).filter_by(
+            id=result_id, user_id=session['user_id']
+        ).first()
 
         if not result:
             return jsonify({'success': False, 'message': 'Result not found!'})
 
-        # Parse stored data
-        user_answers = json.loads(result.user_answers) if result.user_answers else {}
-        questions = json.loads(result.questions_data) if result.questions_data else []
+        # Parse stored data - the heavy parts are decompressed only here
+        user_answers = load_payload('exam_result', result.id, 'user_answers', {}, inline=lambda: result.user_answers)
         subjects_list = result.subjects.split(',') if result.subjects else []
 
-        # V5 FIX: Calculate subject scores for display
-        subject_scores = {}
-        if questions:
-            for i, question in enumerate(questions):
-                subject = question.get('subject', 'Unknown').lower()
-                if subject not in subject_scores:
-                    subject_scores[subject] = {'total': 0, 'correct': 0}
-                
-                subject_scores[subject]['total'] += 1
-                
-                user_answer = user_answers.get(str(i))
-                if user_answer and user_answer.upper() == question.get('correct_answer', '').upper():
-                    subject_scores[subject]['correct'] += 1
+        unresolved = []
+        if result.question_refs:
+            # Server-scored result: resolve references, summary was written at submit time
+            bank = get_question_bank()
+            refs = upgrade_question_refs(result, bank)
+            questions = resolve_question_refs(result.exam_type, refs, bank, result.bank_version)
+            unresolved = [
+                {'position': position, 'ref': ref}
+                for position, (ref, question) in enumerate(zip(refs, questions)) if question is None
+            ]
+            if unresolved:
+                logger.warning(f"Result {result.id}: {len(unresolved)} questions are not in bank {bank.version}")
+            questions = [
+                project_question(question, fields) if question is not None else missing_question(ref)
+                for ref, question in zip(refs, questions)
+            ]
+            db.session.commit()
+            subject_scores = json_loads(result.subject_scores) if result.subject_scores else {}
+        else:
+            questions = load_payload('exam_result', result.id, 'questions_data', [], inline=lambda: result.questions_data)
+            if result.subject_scores:
+                subject_scores = json_loads(result.subject_scores)
+            else:
+                # V5 FIX: Calculate subject scores for display - once, then keep the summary
+                _, subject_scores = grade_questions(questions, user_answers)
+                result.subject_scores = json_dumps(subject_scores)
+                db.session.commit()
+            questions = [project_question(question, fields) for question in questions]
 
         return jsonify({
             'success': True,
@@ -1342,6 +3324,7 @@ def get_exam_result(result_id):
                 'created_at': result.created_at.isoformat(),
                 'user_answers': user_answers,
                 'questions': questions,
+                'unresolved_questions': unresolved,
                 'subject_scores': subject_scores
             }
         })
@@ -1350,97 +3333,253 @@ def get_exam_result(result_id):
         logger.error(f"Get exam result error: {str(e)}")
         return jsonify({'success': False, 'message': 'Error loading exam result.'})
 
-# -------------------- ADMIN ROUTES --------------------
-@app.route('/api/generate-codes', methods=['POST'])
-@admin_required
-def generate_codes():
+@app.route('/api/exam-results/<int:result_id>/explanations')
+def get_exam_result_explanations(result_id):
+    """
+    Lazy review: explanations for just the questions the student opens,
+    by position in the paper (?positions=0,4,7).
+    """
     try:
-        codes = []
-        for _ in range(100):
-            code = generate_activation_code()
-            expires_at = datetime.utcnow() + timedelta(days=150)
+        if 'user_id' not in session:
+            return jsonify({'success': False, 'message': 'Please login first!'})
 
-            while ActivationCode.query.filter_by(code=code).first():
-                code = generate_activation_code()
+        try:
+            positions = sorted({int(p) for p in request.args.get('positions', '').split(',') if p.strip()})
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Positions must be question numbers!'}), 400
 
-            activation_code = ActivationCode(
-                code=code,
-                expires_at=expires_at
-            )
-            db.session.add(activation_code)
-            codes.append(code)
+        if not positions:
+            return jsonify({'success': False, 'message': 'No questions requested!'}), 400
 
-        db.session.commit()
+        result = ExamResult.query.options(undefer_group('detail')).filter_by(
+            id=result_id, user_id=session['user_id']
+        ).first()
+        if not result:
+            return jsonify({'success': False, 'message': 'Result not found!'})
 
-        logger.info(f"Generated 100 activation codes with enhanced format by Admin: {session.get('user_email')}")
+        unresolved = []
+        if result.question_refs:
+            refs = json_loads(result.question_refs)
+            requested = [p for p in positions if 0 <= p < len(refs)]
+            questions = resolve_question_refs(result.exam_type, [refs[p] for p in requested],
+                                              bank_version=result.bank_version)
+            unresolved = [
+                {'position': position, 'ref': refs[position]}
+                for position, question in zip(requested, questions) if question is None
+            ]
+            requested = [position for position, question in zip(requested, questions) if question is not None]
+            questions = [question for question in questions if question is not None]
+        else:
+            all_questions = load_payload('exam_result', result.id, 'questions_data', [],
+                                         inline=lambda: result.questions_data)
+            requested = [p for p in positions if 0 <= p < len(all_questions)]
+            questions = [all_questions[p] for p in requested]
 
         return jsonify({
             'success': True,
-            'message': '100 activation codes generated successfully with enhanced format MSH-XXXX-XXXX!',
-            'codes': codes
+            'explanations': {
+                str(position): question.get('explanation') or ''
+                for position, question in zip(requested, questions)
+            },
+            'unresolved_questions': unresolved
         })
 
+    except Exception as e:
+        logger.error(f"Get exam explanations error: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error loading explanations.'})
+
+# -------------------- ADMIN ROUTES --------------------
+@app.route('/api/generate-codes', methods=['POST'])
+@admin_required
+def generate_codes():
+    """Mint a batch of codes: {count: 1-100000 (default 100), batch_label, expires_days: 1-3650 (default 150)}"""
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            count = int(data.get('count', 100))
+            expires_days = int(data.get('expires_days', 150))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Count and expiry must be numbers!'}), 400
+
+        if not 1 <= count <= MINT_MAX_COUNT:
+            return jsonify({'success': False, 'message': f'Count must be between 1 and {MINT_MAX_COUNT}!'}), 400
+        if not 1 <= expires_days <= MINT_MAX_EXPIRES_DAYS:
+            return jsonify({'success': False, 'message': f'Expiry must be between 1 and {MINT_MAX_EXPIRES_DAYS} days!'}), 400
+
+        batch_label = (data.get('batch_label') or '').strip()[:50] or \
+            f"batch-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(2)}"
+        expires_at = datetime.utcnow() + timedelta(days=expires_days)
+
+        started = time.monotonic()
+        mint_activation_codes(count, batch_label, expires_at)
+        db.session.commit()
+        admin_stats_snapshot.invalidate()
+
+        logger.info(f"Minted {count} activation codes in batch {batch_label} "
+                    f"({time.monotonic() - started:.2f}s) by Admin: {session.get('user_email')}")
+
+        response_data = {
+            'success': True,
+            'message': f'{count} activation codes generated successfully with enhanced format MSH-XXXX-XXXX!',
+            'count': count,
+            'batch_label': batch_label,
+            'export_url': url_for('export_codes', batch=batch_label, format='csv')
+        }
+        # Small batches are returned inline; large ones are downloaded from export_url
+        if count <= MINT_CHUNK_SIZE:
+            response_data['codes'] = [code for (code,) in db.session.query(ActivationCode.code).filter(
+                ActivationCode.batch_label == batch_label
+            ).order_by(ActivationCode.id.desc()).limit(count)]
+        return jsonify(response_data)
+
     except Exception as e:
         logger.error(f"Generate codes error: {str(e)}")
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Error generating codes: {str(e)}'})
 
+@app.route('/api/admin/codes/export')
+@admin_required
+def export_codes():
+    """Stream a batch of codes as CSV (default) or NDJSON (?batch=&format=csv|ndjson)"""
+    batch_label = request.args.get('batch', '')
+    export_format = request.args.get('format', 'csv')
+    if not batch_label or export_format not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'message': 'A batch and a format of csv or ndjson are required!'}), 400
+
+    columns = (ActivationCode.id, ActivationCode.code, ActivationCode.is_used,
+               ActivationCode.created_at, ActivationCode.expires_at)
+
+    def rows():
+        # Keyset over the (batch_label, id) index - memory stays flat for any batch size
+        last_id = 0
+        while True:
+            chunk = db.session.query(*columns).filter(
+                ActivationCode.batch_label == batch_label, ActivationCode.id > last_id
+            ).order_by(ActivationCode.id).limit(MINT_CHUNK_SIZE).all()
+            if not chunk:
+                return
+            yield from chunk
+            last_id = chunk[-1].id
+
+    def generate():
+        if export_format == 'csv':
+            yield 'code,used,created_at,expires_at\n'
+        for row in rows():
+            record = {
+                'code': row.code,
+                'used': bool(row.is_used),
+                'created_at': row.created_at.isoformat() if row.created_at else None,
+                'expires_at': row.expires_at.isoformat() if row.expires_at else None
+            }
+            if export_format == 'csv':
+                yield f"{record['code']},{int(record['used'])},{record['created_at'] or ''},{record['expires_at'] or ''}\n"
+            else:
+                yield json_dumps(record) + '\n'
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = app.response_class(stream_with_context(generate()), mimetype=mimetype)
+    filename = secure_filename(f"msh_codes_{batch_label}.{export_format}")
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 @app.route('/api/admin/stats')
 @admin_required
 def admin_stats():
     try:
-        total_users = User.query.count()
-        activated_users = User.query.filter_by(is_activated=True).count()
-        total_codes = ActivationCode.query.count()
-        used_codes = ActivationCode.query.filter_by(is_used=True).count()
-        total_exams = ExamResult.query.count()
-
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        recent_users = User.query.filter(User.created_at >= week_ago).count()
-        recent_exams = ExamResult.query.filter(ExamResult.created_at >= week_ago).count()
-
-        active_trials = User.query.filter_by(is_activated=False).count()
-        expired_trials = User.query.filter(
-            User.is_activated == False,
-            User.trial_start < (datetime.utcnow() - timedelta(hours=1))
-        ).count()
-
-        # V5: Get localStorage sync stats
-        users_with_browser_data = User.query.filter(User.browser_data.isnot(None)).count()
-        browser_synced_results = ExamResult.query.filter_by(browser_synced=True).count()
-
+        stats, generated_at = admin_stats_snapshot.get()
         return jsonify({
             'success': True,
-            'stats': {
-                'total_users': total_users,
-                'activated_users': activated_users,
-                'active_trials': active_trials,
-                'expired_trials': expired_trials,
-                'total_codes': total_codes,
-                'used_codes': used_codes,
-                'total_exams': total_exams,
-                'recent_users': recent_users,
-                'recent_exams': recent_exams,
-                'users_with_browser_data': users_with_browser_data,
-                'browser_synced_results': browser_synced_results
-            }
+            'stats': stats,
+            'generated_at': generated_at.isoformat()
         })
 
     except Exception as e:
         logger.error(f"Admin stats error: {str(e)}")
         return jsonify({'success': False, 'message': 'Error loading admin statistics.'})
 
+ADMIN_PAGE_SIZE = 50
+ADMIN_MAX_PAGE_SIZE = 500
+
+def encode_page_cursor(created_at, row_id):
+    """Opaque keyset cursor for the last row of a page ordered by (created_at, id) descending"""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode('utf-8')).decode('ascii')
+
+def decode_page_cursor(cursor):
+    created_at, row_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+    return datetime.fromisoformat(created_at), int(row_id)
+
+def keyset_page_query(query, model, cursor, limit):
+    """`query` narrowed to the page after `cursor`, newest first (one extra row tells whether more follow)"""
+    if cursor:
+        created_at, row_id = decode_page_cursor(cursor)
+        # Row-value comparison, so the database seeks straight into the index
+        query = query.filter(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+def keyset_page(query, model, cursor, limit, entity=lambda row: row):
+    """
+    One page of `query`, newest first. Rows after the cursor are found through the
+    (created_at, id) index, so deep pages cost the same as the first one.
+    `entity` picks the model instance out of a result row. Returns (rows, next_cursor or None).
+    """
+    rows = keyset_page_query(query, model, cursor, limit).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = entity(rows[-1])
+    return rows, encode_page_cursor(last.created_at, last.id)
+
+def page_size_arg():
+    try:
+        return max(1, min(int(request.args.get('limit', ADMIN_PAGE_SIZE)), ADMIN_MAX_PAGE_SIZE))
+    except ValueError:
+        return ADMIN_PAGE_SIZE
+
+def user_status_filter(status):
+    """SQL condition matching check_access_status() for one status"""
+    trial_cutoff = datetime.utcnow() - timedelta(hours=1)
+    in_trial = and_(User.device_id.isnot(None), User.trial_start.isnot(None), User.trial_start > trial_cutoff)
+    not_activated = or_(User.is_activated == False, User.is_activated.is_(None))
+    not_admin = or_(User.is_admin == False, User.is_admin.is_(None))
+    if status == 'activated':
+        return User.is_activated == True
+    if status == 'admin':
+        return and_(not_activated, User.is_admin == True)
+    if status == 'trial':
+        return and_(not_activated, not_admin, in_trial)
+    if status == 'expired':
+        return and_(not_activated, not_admin, ~in_trial)
+    raise ValueError(f"Unknown status: {status}")
+
+def admin_users_query(status='all', search=''):
+    """Filtered admin user list as (User, has_browser_data) rows - check-query-plans explains this same query"""
+    # Only whether browser data is stored is needed here, not the payload itself
+    query = db.session.query(User, has_payload('user', User.id, 'browser_data'))
+    if status != 'all':
+        query = query.filter(user_status_filter(status))
+    if search:
+        pattern = f"%{search}%"
+        query = query.filter(or_(User.email.ilike(pattern), User.full_name.ilike(pattern)))
+    return query
+
 @app.route('/api/admin/users')
 @admin_required
 def admin_users():
+    """Users newest first, a page at a time (?cursor=&limit=&status=&q=)"""
     try:
-        user_exam_counts = db.session.query(
-            User,
-            func.count(ExamResult.id).label('exam_count')
-        ).outerjoin(ExamResult).group_by(User.id).order_by(User.created_at.desc()).all()
+        query = admin_users_query(request.args.get('status', 'all'), request.args.get('q', '').strip())
+
+        rows, next_cursor = keyset_page(query, User, request.args.get('cursor'), page_size_arg(),
+                                        entity=lambda row: row[0])
+
+        # Exam counts for this page only
+        user_ids = [user.id for user, _ in rows]
+        exam_counts = dict(db.session.query(ExamResult.user_id, func.count(ExamResult.id)).filter(
+            ExamResult.user_id.in_(user_ids)
+        ).group_by(ExamResult.user_id).all()) if user_ids else {}
 
         users_data = []
-        for user, exam_count in user_exam_counts:
+        for user, has_browser_data in rows:
             access_status = check_access_status(user)
             trial_status = access_status['status']
             if trial_status == 'trial':
@@ -1458,26 +3597,54 @@ def admin_users():
                 'email': user.email,
                 'ip_address': user.ip_address,
                 'status': trial_status,
-                'exam_count': exam_count,
+                'exam_count': exam_counts.get(user.id, 0),
                 'join_date': user.created_at.strftime('%Y-%m-%d %H:%M'),
                 'last_login': user.last_login.strftime('%Y-%m-%d %H:%M') if user.last_login else 'Never',
                 'last_activity': last_activity_str,
                 'activation_code': user.activation_code,
                 'device_id': user.device_id,
-                'has_browser_data': bool(user.browser_data)
+                'has_browser_data': bool(has_browser_data)
             })
 
-        return jsonify({'success': True, 'users': users_data})
+        return jsonify({'success': True, 'users': users_data, 'next_cursor': next_cursor})
 
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid filter or cursor: {str(e)}'}), 400
     except Exception as e:
         logger.error(f"Admin users error: {str(e)}")
         return jsonify({'success': False, 'message': 'Error loading users.'})
 
+def admin_codes_query(used='all', batch_label=None, search=''):
+    """Filtered admin code list - check-query-plans explains this same query"""
+    query = ActivationCode.query.options(
+        joinedload(ActivationCode.used_user).load_only(User.full_name)
+    )
+    if used == 'used':
+        query = query.filter(ActivationCode.is_used == True)
+    elif used == 'unused':
+        query = query.filter(ActivationCode.is_used == False)
+    elif used != 'all':
+        raise ValueError(f"Unknown used filter: {used}")
+
+    if batch_label:
+        query = query.filter(ActivationCode.batch_label == batch_label)
+
+    search = search.upper()
+    if search:
+        # A range, not LIKE: SQLite's LIKE is case-insensitive and cannot use the index on code
+        upper_bound = search[:-1] + chr(ord(search[-1]) + 1)
+        query = query.filter(ActivationCode.code >= search, ActivationCode.code < upper_bound)
+    return query
+
 @app.route('/api/admin/codes')
 @admin_required
 def admin_codes():
+    """Activation codes newest first, a page at a time (?cursor=&limit=&used=all|used|unused&batch=&q=)"""
     try:
-        codes = ActivationCode.query.order_by(ActivationCode.created_at.desc()).all()
+        query = admin_codes_query(request.args.get('used', 'all'), request.args.get('batch'),
+                                  request.args.get('q', '').strip())
+
+        codes, next_cursor = keyset_page(query, ActivationCode, request.args.get('cursor'), page_size_arg())
         codes_data = []
 
         for code in codes:
@@ -1490,15 +3657,40 @@ def admin_codes():
                 'used_by': used_by_name,
                 'created_at': code.created_at.strftime('%Y-%m-%d'),
                 'expires_at': code.expires_at.strftime('%Y-%m-%d') if code.expires_at else None,
-                'used_at': code.used_at.strftime('%Y-%m-%d %H:%M') if code.used_at else None
+                'used_at': code.used_at.strftime('%Y-%m-%d %H:%M') if code.used_at else None,
+                'batch_label': code.batch_label
             })
 
-        return jsonify({'success': True, 'codes': codes_data})
+        return jsonify({'success': True, 'codes': codes_data, 'next_cursor': next_cursor})
 
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid filter or cursor: {str(e)}'}), 400
     except Exception as e:
         logger.error(f"Admin codes error: {str(e)}")
         return jsonify({'success': False, 'message': 'Error loading activation codes.'})
 
+@app.route('/api/admin/reload-questions', methods=['POST'])
+@admin_required
+def admin_reload_questions():
+    """
+    Re-read questions/ without a restart. This worker swaps at once; the others
+    notice the changed sources within QUESTION_BANK_CHECK_INTERVAL seconds.
+    """
+    try:
+        bank = reload_question_bank()
+        logger.info(f"Question bank reloaded by Admin: {session.get('user_email')}")
+        return jsonify({
+            'success': True,
+            'message': 'Question bank reloaded successfully!',
+            'bank': bank.summary(),
+            'other_workers_within_seconds': QUESTION_BANK_CHECK_INTERVAL,
+            'paper_pool': paper_pool.summary()
+        })
+
+    except Exception as e:
+        logger.error(f"Reload questions error: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error reloading questions: {str(e)}'})
+
 # -------------------- ERROR HANDLERS --------------------
 @app.errorhandler(404)
 def not_found(error):
@@ -1537,17 +3729,211 @@ def health_check():
             'error': str(e)
         }), 500
 
+# -------------------- CLI COMMANDS --------------------
+def print_question_bank_report(bank):
+    for name in sorted(f"{exam}_{subject}.json" for exam, subject in bank.keys()):
+        print(f"OK      {name}")
+    for name, errors in sorted(bank.errors.items()):
+        print(f"INVALID {name}")
+        for error in errors:
+            print(f"        - {error}")
+
+@app.cli.command('validate-questions')
+@click.option('--update-sections', is_flag=True, help='Rewrite sections.json from the sections in use.')
+def validate_questions_command(update_sections):
+    """Validate every question file against the bank schema"""
+    if update_sections:
+        sections = {}
+        for file_name in sorted(os.listdir(QUESTIONS_DIR)):
+            stem, ext = os.path.splitext(file_name)
+            if ext == '.json' and '_' in stem:
+                try:
+                    with open(os.path.join(QUESTIONS_DIR, file_name), 'r', encoding='utf-8') as f:
+                        questions = json.load(f).get('questions', [])
+                except ValueError:
+                    continue
+                sections[stem] = sorted({q['section'] for q in questions if isinstance(q, dict) and q.get('section')})
+        with open(SECTIONS_FILE, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(sections, indent=2) + '\n')
+        print(f"Updated {SECTIONS_FILE}")
+
+    bank = QuestionBank.load(QUESTIONS_DIR)
+    print_question_bank_report(bank)
+    if bank.errors:
+        raise SystemExit(1)
+
+@app.cli.command('compile-questions')
+def compile_questions_command():
+    """Validate questions/*.json and compile them into the shared memory-mapped bank artifact"""
+    try:
+        directory = compile_question_bank(QUESTIONS_DIR, COMPILED_BANK_PATH)
+    except ValueError as e:
+        print_question_bank_report(QuestionBank.load(QUESTIONS_DIR))
+        print(f"Not compiled: {str(e)}")
+        raise SystemExit(1)
+    print(f"Compiled {len(directory['banks'])} subject banks (version {directory['version']}) to {COMPILED_BANK_PATH}")
+
+def regrade_results(results, bank):
+    """
+    Re-score server-scored results against the bank's answer key in one vectorized
+    batch and move them to the bank's version. A result referencing a question the
+    bank no longer has is left as it is. Returns (regraded, changed) counts.
+    """
+    gradable = []
+    paper_keys = []
+    for result in results:
+        refs = json_loads(result.question_refs)
+        located = locate_question_refs(result.exam_type, refs, bank, result.bank_version)
+        if not refs or any(index is None for _, index in located):
+            continue
+        gradable.append(result)
+        paper_keys.append(PaperKey.from_refs(refs, paper_answer_key(result.exam_type, refs, bank)))
+    if not gradable:
+        return 0, 0
+
+    # One shared subject list so every paper's ids index the same columns
+    subjects = sorted({subject for paper_key in paper_keys for subject in paper_key.subjects})
+    lookup = {subject: i for i, subject in enumerate(subjects)}
+    positions = max(len(paper_key) for paper_key in paper_keys)
+    keys = np.zeros((len(gradable), positions), dtype=np.uint8)
+    sheets = np.zeros_like(keys)
+    subject_ids = np.zeros((len(gradable), positions), dtype=np.intp)
+    lengths = [len(paper_key) for paper_key in paper_keys]
+    answers = load_payloads('exam_result', [result.id for result in gradable], 'user_answers')
+
+    for row, (result, paper_key) in enumerate(zip(gradable, paper_keys)):
+        length = lengths[row]
+        remap = np.array([lookup[subject] for subject in paper_key.subjects], dtype=np.intp)
+        keys[row, :length] = paper_key.key
+        subject_ids[row, :length] = remap[paper_key.subject_ids]
+        user_answers = answers.get(result.id)
+        if user_answers is None:
+            user_answers = json_loads(result.user_answers or '{}')
+        sheets[row, :length] = encode_answer_sheet(user_answers, length)
+
+    totals, subject_correct, subject_total = score_answer_sheets(keys, sheets, subject_ids, lengths, len(subjects))
+
+    changed = 0
+    for row, result in enumerate(gradable):
+        score = int(totals[row])
+        if score != result.score:
+            changed += 1
+        result.score = score
+        result.percentage = round((score / lengths[row]) * 100, 2) if lengths[row] else 0
+        result.subject_scores = json_dumps({
+            subject: {'total': int(subject_total[row, i]), 'correct': int(subject_correct[row, i])}
+            for i, subject in enumerate(subjects) if subject_total[row, i]
+        })
+        result.bank_version = bank.version
+    return len(gradable), changed
+
+@app.cli.command('regrade-results')
+def regrade_results_command():
+    """Re-score results issued on an older bank version (e.g. after an answer-key fix) against the current bank"""
+    bank = get_question_bank()
+    result_ids = [row.id for row in db.session.query(ExamResult.id).filter(
+        ExamResult.question_refs.isnot(None),
+        ExamResult.bank_version != bank.version
+    ).order_by(ExamResult.id)]
+
+    regraded = 0
+    changed = 0
+    for start in range(0, len(result_ids), 500):
+        results = ExamResult.query.options(undefer_group('detail')).filter(
+            ExamResult.id.in_(result_ids[start:start + 500])
+        ).all()
+        batch_regraded, batch_changed = regrade_results(results, bank)
+        regraded += batch_regraded
+        changed += batch_changed
+        db.session.commit()
+
+    if changed:
+        # Running totals are rebuilt from the regraded history on next read
+        UserStats.query.delete()
+        db.session.commit()
+
+    print(f"Regraded {regraded} of {len(result_ids)} results from older banks onto {bank.version} "
+          f"({changed} scores changed, {len(result_ids) - regraded} reference removed questions and were kept)")
+
+def hot_queries():
+    """
+    The lookups hit on every request or sync, as they are issued by the routes.
+    Paged admin lists are built by the routes' own query functions.
+    """
+    now = datetime.utcnow()
+    cursor = encode_page_cursor(now, 1000)
+
+    def users_page(status='all', search=''):
+        return keyset_page_query(admin_users_query(status, search), User, cursor, ADMIN_PAGE_SIZE)
+
+    def codes_page(used='all', batch_label=None, search=''):
+        return keyset_page_query(admin_codes_query(used, batch_label, search), ActivationCode, cursor, ADMIN_PAGE_SIZE)
+
+    return [
+        ('user by device', User.query.filter_by(device_id='device')),
+        ('user by email', User.query.filter_by(email='user@example.com')),
+        ('active session', UserSession.query.filter_by(user_id=1, is_active=True)
+            .order_by(UserSession.login_time.desc()).limit(1)),
+        ('unused activation code', ActivationCode.query.filter_by(code='MSH-0000-0000', is_used=False)),
+        ('result by fingerprint', ExamResult.query.filter_by(fingerprint='0' * 32)),
+        ('recent results', ExamResult.query.filter_by(user_id=1).order_by(ExamResult.created_at.desc()).limit(20)),
+        ('exam session', TemporaryData.query.filter_by(data_type='exam_session', data_key='exam')),
+        ('expired exam sessions', expired_exam_session_ids()),
+        ('expired temporary data', TemporaryData.query.filter(TemporaryData.expires_at < now)),
+        ('admin users page', users_page()),
+        ('admin codes page', codes_page()),
+        ('admin used codes page', codes_page('used')),
+        ('admin unused codes page', codes_page('unused')),
+        ('admin batch codes page', codes_page(batch_label='batch')),
+        ('admin unused batch codes page', codes_page('unused', 'batch')),
+        ('admin code search', codes_page(search='MSH-AB')),
+    ]
+
+# Queries whose sort only covers rows a selective filter already narrowed down
+SORT_ALLOWED_QUERIES = {'admin code search'}
+
+def explain_query(connection, query):
+    """SQLite EXPLAIN QUERY PLAN detail lines for an ORM query"""
+    compiled = query.statement.compile(dialect=connection.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params).fetchall()
+    return [row[-1] for row in rows]
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """
+    Fail if any hot query falls back to a full table scan or sort. Checked
+    against a fresh in-memory SQLite schema built by the migrations, so it runs
+    in the build whatever database the app is configured with.
+    """
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    run_migrations(engine)
+
+    scans = []
+    with engine.connect() as connection:
+        for name, query in hot_queries():
+            plan = explain_query(connection, query)
+            # An index-ordered scan (SCAN ... USING INDEX) under a LIMIT is fine;
+            # a sort is not - it reads every matching row before the LIMIT applies
+            full_scans = [step for step in plan if step.startswith('SCAN ') and ' USING ' not in step]
+            if name not in SORT_ALLOWED_QUERIES:
+                full_scans += [step for step in plan if step.startswith('USE TEMP B-TREE')]
+            print(f"{'SCAN' if full_scans else 'ok'}\t{name}: {' | '.join(plan)}")
+            if full_scans:
+                scans.append(name)
+
+    if scans:
+        print(f"{len(scans)} queries scan or sort a whole table: {', '.join(scans)}")
+        raise SystemExit(1)
+
 # -------------------- APPLICATION STARTUP --------------------
 def initialize_application():
     try:
         with app.app_context():
             if ActivationCode.query.count() == 0:
                 logger.info("Creating initial activation codes...")
-                for _ in range(10):
-                    code = generate_activation_code()
-                    expires_at = datetime.utcnow() + timedelta(days=150)
-                    activation_code = ActivationCode(code=code, expires_at=expires_at)
-                    db.session.add(activation_code)
+                mint_activation_codes(10, 'initial', datetime.utcnow() + timedelta(days=150))
                 db.session.commit()
                 logger.info("Initial activation codes created")
             
@@ -11,6 +11,8 @@ const AppState = {
     trialElapsedSeconds: 0,
     examResults: null,
     isInitialized: false,
+    // V5: Set once the server reports it computes the trial clock itself (heartbeats optional)
+    serverTrialClock: false,
     // V5: LocalStorage keys
     localStorageKeys: {
         USER_DATA: 'msh_cbt_user_data_v5',
@@ -19,6 +21,7 @@ const AppState = {
         TRIAL_TIMER: 'msh_cbt_trial_timer_v5',
         LAST_SYNC: 'msh_cbt_last_sync_v5',
         BROWSER_DATA: 'msh_cbt_browser_data_v5',
+        SYNC_REVISION: 'msh_cbt_sync_revision_v5',
         TRIAL_EXPIRED: 'msh_cbt_trial_expired_v5'
     },
     // V5: Trial timer state
@@ -160,6 +163,9 @@ const PERFORMANCE_MESSAGES = {
     }
 };
 
+// Question fields the results screen needs up front - explanations load on demand
+const REVIEW_QUESTION_FIELDS = 'id,question,passage,options,correct_answer,section,subject';
+
 // ==================== LOCALSTORAGE FUNCTIONS - V5 NEW ====================
 
 /**
@@ -389,21 +395,23 @@ function saveBrowserData(key, data) {
 }
 
 /**
- * V5: Get all browser data for sync
+ * V5: Get the browser data patch for sync - only the keys changed since the last sync
  */
 function getBrowserDataForSync() {
     try {
         const browserData = loadFromLocalStorage(AppState.localStorageKeys.BROWSER_DATA) || {};
         const syncData = {};
+        const versions = {};
         
         // Prepare data for sync
         for (const [key, value] of Object.entries(browserData)) {
             if (!value.synced) {
                 syncData[key] = value.data;
+                versions[key] = value.lastUpdated;
             }
         }
         
-        return syncData;
+        return { syncData, versions };
     } catch (error) {
         console.error('Error getting browser data for sync:', error);
         return null;
@@ -411,15 +419,16 @@ function getBrowserDataForSync() {
 }
 
 /**
- * V5: Mark browser data as synced
+ * V5: Mark browser data as synced. With `versions` a key is only marked when it
+ * has not been updated again while the sync request was in flight.
  */
-function markBrowserDataAsSynced(keys) {
+function markBrowserDataAsSynced(keys, versions = null) {
     try {
         let browserData = loadFromLocalStorage(AppState.localStorageKeys.BROWSER_DATA) || {};
         
         if (Array.isArray(keys)) {
             keys.forEach(key => {
-                if (browserData[key]) {
+                if (browserData[key] && (!versions || browserData[key].lastUpdated === versions[key])) {
                     browserData[key].synced = true;
                     browserData[key].lastSynced = new Date().toISOString();
                 }
@@ -444,32 +453,58 @@ function markBrowserDataAsSynced(keys) {
 }
 
 /**
- * V5: Sync browser data to server
+ * V5: Server revision (ETag) of the browser data this client last saw
  */
-async function syncBrowserDataToServer() {
+function getSyncRevision() {
+    return loadFromLocalStorage(AppState.localStorageKeys.SYNC_REVISION);
+}
+
+function setSyncRevision(revision) {
+    if (revision) {
+        saveToLocalStorage(AppState.localStorageKeys.SYNC_REVISION, revision);
+    }
+}
+
+/**
+ * V5: Sync browser data to server - sends a patch of the changed keys against
+ * the last seen revision; the server merges it.
+ */
+async function syncBrowserDataToServer(isRetry = false) {
     try {
-        const syncData = getBrowserDataForSync();
+        const patch = getBrowserDataForSync();
         
-        if (!syncData || Object.keys(syncData).length === 0) {
+        if (!patch || Object.keys(patch.syncData).length === 0) {
             console.log('📡 No browser data to sync');
             return true;
         }
         
+        const { syncData, versions } = patch;
         console.log('📡 Syncing browser data to server:', Object.keys(syncData));
         
+        const headers = { 'Content-Type': 'application/json' };
+        const revision = getSyncRevision();
+        if (revision) {
+            headers['If-Match'] = `"${revision}"`;
+        }
+        
         const response = await fetch('/api/user/sync-browser-data', {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
+            headers,
             body: JSON.stringify(syncData)
         });
         
+        // Changed on the server (another tab or device) - catch up, then resend the patch once
+        if (response.status === 412 && !isRetry) {
+            await getBrowserDataFromServer();
+            return syncBrowserDataToServer(true);
+        }
+        
         const result = await response.json();
         
         if (result.success) {
             // Mark data as synced
-            markBrowserDataAsSynced(Object.keys(syncData));
+            setSyncRevision(result.revision);
+            markBrowserDataAsSynced(Object.keys(syncData), versions);
             console.log('✅ Browser data synced successfully');
             return true;
         } else {
@@ -487,11 +522,24 @@ async function syncBrowserDataToServer() {
  */
 async function getBrowserDataFromServer() {
     try {
-        const response = await fetch('/api/user/get-browser-data');
+        const headers = {};
+        const revision = getSyncRevision();
+        if (revision) {
+            headers['If-None-Match'] = `"${revision}"`;
+        }
+        
+        const response = await fetch('/api/user/get-browser-data', { headers });
+        
+        // Nothing changed since the last pull
+        if (response.status === 304) {
+            return { success: true, not_modified: true };
+        }
+        
         const result = await response.json();
         
         if (result.success) {
             console.log('📥 Got browser data from server');
+            setSyncRevision(result.revision);
             
             // Merge with local data
             if (result.exam_results && result.exam_results.length > 0) {
@@ -659,8 +707,8 @@ function startOfflineTrialTimer() {
             if (AppState.trialTimerState.elapsedSeconds % 30 === 0) {
                 saveTrialTimerToStorage(AppState.trialTimerState);
                 
-                // Update server if online
-                if (navigator.onLine) {
+                // Update server if online - not needed once the server keeps the trial clock
+                if (navigator.onLine && !AppState.serverTrialClock) {
                     updateTrialTimerOnServer();
                 }
             }
@@ -722,6 +770,8 @@ async function getTrialStatusFromServer() {
         const result = await response.json();
         
         if (result.success) {
+            AppState.serverTrialClock = result.clock === 'server';
+            
             // Update local state with server data
             if (result.trial_active && result.elapsed_seconds) {
                 AppState.trialElapsedSeconds = result.elapsed_seconds;
@@ -2073,7 +2123,7 @@ function displayAdminUsers(users) {
     html += `
             </tbody>
         </table>
-        <div class="text-muted text-end mt-2">Total: ${users.length} users</div>
+        <div class="text-muted text-end mt-2">Showing the ${users.length} newest users</div>
     `;
     
     adminUsersTable.innerHTML = html;
@@ -2153,7 +2203,7 @@ function displayAdminCodes(codes) {
     html += `
             </tbody>
         </table>
-        <div class="text-muted text-end mt-2">Total: ${codes.length} codes</div>
+        <div class="text-muted text-end mt-2">Showing the ${codes.length} newest codes</div>
     `;
     
     adminCodesTable.innerHTML = html;
@@ -2192,7 +2242,7 @@ async function generateActivationCodes() {
         const result = await response.json();
         
         if (result.success) {
-            showNotification('100 activation codes generated successfully!', 'success');
+            showNotification(`${result.count} activation codes generated successfully!`, 'success');
             refreshAdminCodes();
         } else {
             showNotification('Error generating codes: ' + result.message, 'error');
@@ -2550,7 +2600,8 @@ async function startExam(examType, selectedSubjects) {
             },
             body: JSON.stringify({
                 exam_type: examType,
-                subjects: selectedSubjects
+                subjects: selectedSubjects,
+                ids_only: true
             })
         });
 
@@ -2558,13 +2609,16 @@ async function startExam(examType, selectedSubjects) {
         
         if (result.success) {
             // V5 FIX: Verify we have questions
-            let questions = result.questions;
+            let questions = result.questions
+                ? result.questions.map((question, index) => ({ ...question, id: index, selected_answer: null }))
+                : await assembleQuestionsFromBundles(result);
             
             if (questions.length !== 60) {
                 console.warn(`Expected 60 questions but got ${questions.length}`);
             }
             
             AppState.currentExam.questions = questions;
+            AppState.currentExam.examId = result.exam_id;
             
             if (AppState.currentExam.questions.length === 0) {
                 showNotification('No questions available for the selected subjects. Please try different subjects.', 'error');
@@ -2588,6 +2642,28 @@ async function startExam(examType, selectedSubjects) {
     }
 }
 
+/**
+ * Build the paper from question references and per-subject bundles.
+ * Bundle URLs are versioned by ETag, so banks seen before come from the browser cache.
+ */
+async function assembleQuestionsFromBundles(result) {
+    const bundles = {};
+    await Promise.all(Object.entries(result.bundles || {}).map(async ([subject, bundle]) => {
+        const response = await fetch(bundle.url);
+        bundles[subject] = await response.json();
+    }));
+
+    // References are "subject#id" - index each bundle by question id
+    const byId = {};
+    for (const [subject, bundle] of Object.entries(bundles)) {
+        byId[subject] = new Map(bundle.questions.map(question => [String(question.id), question]));
+    }
+    return (result.question_refs || []).map((ref, index) => {
+        const [subject, questionId] = ref.split('#');
+        return { ...byId[subject].get(questionId), id: index, selected_answer: null };
+    });
+}
+
 /**
  * Get exam time based on type and subjects - V5 UPDATE: Standard timing
  */
@@ -2869,10 +2945,8 @@ async function submitExam() {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({
-                exam_type: AppState.currentExam.type,
-                subjects: AppState.currentExam.subjects,
+                exam_id: AppState.currentExam.examId,
                 user_answers: AppState.currentExam.userAnswers,
-                questions: AppState.currentExam.questions,
                 time_taken: timeTaken
             })
         });
@@ -3051,15 +3125,22 @@ async function displayResults() {
     // V5 FIX: If we have a result ID and are online, try to fetch detailed results from server
     if (AppState.examResults.resultId && navigator.onLine && !AppState.examResults.storedLocally) {
         try {
-            const response = await fetch(`/api/exam-results/${AppState.examResults.resultId}`);
+            // Explanations are left out here and loaded per question in the review screen
+            const response = await fetch(`/api/exam-results/${AppState.examResults.resultId}?fields=${REVIEW_QUESTION_FIELDS}`);
             const result = await response.json();
             
             if (result.success && result.result) {
                 // Update with server data
+                // Questions the bank no longer has come back as placeholders - keep the local copy if there is one
+                const localQuestions = AppState.examResults.questions || [];
+                const serverQuestions = result.result.questions
+                    ? result.result.questions.map((question, index) =>
+                        question.missing && localQuestions[index] ? localQuestions[index] : question)
+                    : null;
                 AppState.examResults = {
                     ...AppState.examResults,
                     subjectScores: result.result.subject_scores || AppState.examResults.subjectScores,
-                    questions: result.result.questions || AppState.examResults.questions,
+                    questions: serverQuestions || AppState.examResults.questions,
                     userAnswers: result.result.user_answers || AppState.examResults.userAnswers
                 };
                 
@@ -3186,6 +3267,7 @@ function displayReviewQuestions(filter) {
             <div class="${itemClass}">
                 <div class="review-question mb-3">
                     <strong>Q${index + 1}:</strong> ${question.question}
+                    ${question.missing ? `<div class="text-warning small mt-2"><i class="fas fa-exclamation-triangle me-1"></i>This question was removed or changed after your exam.</div>` : ''}
                     ${question.passage ? `<div class="text-muted small mt-2"><em>Comprehension Passage</em></div>` : ''}
                 </div>
 
@@ -3220,7 +3302,13 @@ function displayReviewQuestions(filter) {
                 ${!isUnanswered ? `
                     <div class="review-explanation mt-3 p-2 bg-light rounded">
                         <strong><i class="fas fa-lightbulb me-2 text-warning"></i>Explanation:</strong>
-                        <p class="mb-0 mt-2">${question.explanation || 'No explanation available.'}</p>
+                        ${question.explanation !== undefined || !AppState.examResults.resultId ? `
+                            <p class="mb-0 mt-2">${question.explanation || 'No explanation available.'}</p>
+                        ` : `
+                            <p class="mb-0 mt-2" id="reviewExplanation${index}">
+                                <button class="btn btn-sm btn-outline-secondary" onclick="showExplanation(${index})">Show explanation</button>
+                            </p>
+                        `}
                     </div>
                 ` : `
                     <div class="review-explanation mt-3 p-2 bg-info-light rounded">
@@ -3243,6 +3331,35 @@ function displayReviewQuestions(filter) {
     event.target.classList.add('active');
 }
 
+/**
+ * Load the explanation of one reviewed question on demand
+ */
+async function showExplanation(index) {
+    const container = document.getElementById(`reviewExplanation${index}`);
+    const question = AppState.examResults.questions[index];
+    if (!container || !question) return;
+
+    container.innerHTML = '<span class="text-muted">Loading explanation...</span>';
+    try {
+        const response = await fetch(`/api/exam-results/${AppState.examResults.resultId}/explanations?positions=${index}`);
+        const result = await response.json();
+
+        if (result.success) {
+            question.explanation = result.explanations[index] || '';
+            // Cache locally only - an explanation is not a change to sync or a new activity
+            saveToLocalStorage(AppState.localStorageKeys.EXAM_RESULTS, {
+                ...AppState.examResults,
+                lastSaved: new Date().toISOString(),
+                storedLocally: true
+            });
+        }
+        container.innerHTML = question.explanation || 'No explanation available.';
+    } catch (error) {
+        console.log('Could not load explanation:', error);
+        container.innerHTML = `<button class="btn btn-sm btn-outline-secondary" onclick="showExplanation(${index})">Retry</button>`;
+    }
+}
+
 /**
  * Filter review questions
  */